@@ -18,6 +18,7 @@ from controllers.menu_manager import MenuManager
 
 import threading
 import time
+import multiprocessing
 
 class App:
     """应用程序类，负责初始化和协调MVC组件"""
@@ -479,4 +480,6 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    # 打包后的 exe 中工具脚本会使用进程池，子进程需要在此处分流
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
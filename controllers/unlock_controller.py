@@ -10,6 +10,18 @@ import threading
 import time
 import random
 
+# 优先使用 orjson 序列化下载器配置和解析结果帧，未安装时回退到标准库
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    import json
+    json_loads = json.loads
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
 
 class UnlockController(QObject):
     """解锁功能控制器(Controller层)"""
@@ -637,9 +649,11 @@ class UnlockController(QObject):
                             )
                             if reply == QMessageBox.Yes:
                                 # 执行修复
+                                # 只修复检查出问题的文件，无需重新扫描目录
+                                candidate_files = [p[0] for p in result["problems"]]
                                 threading.Thread(
                                     target=self._run_fix_tool, 
-                                    args=(module, target_path, progress_callback, script_name),
+                                    args=(module, target_path, progress_callback, script_name, candidate_files),
                                     daemon=True
                                 ).start()
                             else:
@@ -664,11 +678,12 @@ class UnlockController(QObject):
         
         threading.Thread(target=run, daemon=True).start()
     
-    def _run_fix_tool(self, module, target_path, progress_callback, script_name):
+    def _run_fix_tool(self, module, target_path, progress_callback, script_name, candidate_files=None):
         """执行修复工具"""
         try:
             fix_func = getattr(module, "run_fix")
-            result = fix_func(target_path, progress_callback=progress_callback)
+            result = fix_func(target_path, progress_callback=progress_callback,
+                              candidate_files=candidate_files)
             message = result.get("message", "修复完成")
             self.toolCompleted.emit(f"{script_name} [修复]", message, True)
         except Exception as e:
@@ -898,7 +913,8 @@ class UnlockController(QObject):
                 def progress_callback(msg):
                     QTimer.singleShot(0, lambda m=msg: self.view.set_status(f"[批量清单] {m}"))
                 
-                result = run_complete_all(lua_dir, depot_cache, progress_callback)
+                result = run_complete_all(lua_dir, depot_cache, progress_callback,
+                                          token=self.config_model.get("github_token", ""))
                 
                 message = result.get("message", "完成")
                 self.toolCompleted.emit("批量补全清单", message, result.get("success", False))
@@ -951,8 +967,6 @@ class UnlockController(QObject):
         
         def run():
             import subprocess
-            import json
-            import tempfile
             import time
             import sys
             from pathlib import Path
@@ -997,36 +1011,63 @@ class UnlockController(QObject):
                 "manifest_only": False
             }
             
-            # 写入临时配置文件
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as tmp:
-                json.dump(config_dict, tmp)
-                temp_config_path = tmp.name
+            config_bytes = json_dumps(config_dict)
+            
+            # 配置不落盘：Linux 通过 memfd 传递 (子进程读取 /proc/self/fd/N)，
+            # 其他平台 (Windows) 由独立线程写入 stdin，与输出读取并行，不受管道容量限制
+            config_fd = None
+            if hasattr(os, "memfd_create"):
+                config_fd = os.memfd_create("unlock_config", 0)
+                os.write(config_fd, config_bytes)
+                os.lseek(config_fd, 0, os.SEEK_SET)
+                go_args = ["-config", f"/proc/self/fd/{config_fd}"]
+            else:
+                go_args = []
             
             try:
                 # 启动 Go 下载器
                 process = subprocess.Popen(
-                    [str(go_binary), "-config", temp_config_path],
+                    [str(go_binary), *go_args],
+                    stdin=subprocess.PIPE if config_fd is None else subprocess.DEVNULL,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
+                    pass_fds=(config_fd,) if config_fd is not None else (),
                     text=False
                 )
                 
-                last_json_line = ""
+                if config_fd is None:
+                    def feed_config():
+                        try:
+                            process.stdin.write(config_bytes)
+                            process.stdin.close()
+                        except OSError:
+                            pass
+                    threading.Thread(target=feed_config, daemon=True).start()
+                
+                summary = None
+                results = []
                 
-                # 实时读取输出
-                while True:
-                    line = process.stdout.readline()
-                    if not line and process.poll() is not None:
-                        break
-                    
+                # 实时读取输出 (NDJSON: 每个游戏一行 result，结束时一行 summary)
+                # 逐行迭代直到 EOF，无需每次循环调用 poll()
+                for line in process.stdout:
                     line_str = line.decode('utf-8', errors='ignore').strip()
                     if not line_str:
                         continue
                     
-                    # 解析 JSON 结果
-                    if line_str.startswith('{') and '"results"' in line_str:
-                        last_json_line = line_str
-                        continue
+                    # 解析 JSON 帧
+                    if line_str.startswith('{'):
+                        try:
+                            frame = json_loads(line_str)
+                        except ValueError:
+                            frame = None
+                        if isinstance(frame, dict):
+                            if frame.get("type") == "result":
+                                results.append(frame)
+                            elif frame.get("type") == "summary" or "success" in frame:
+                                # 旧版下载器在结束时输出带 results 的单行汇总 JSON
+                                results.extend(frame.get("results") or [])
+                                summary = frame
+                            continue
                     
                     # 显示进度
                     if "[PROGRESS]" in line_str:
@@ -1059,20 +1100,15 @@ class UnlockController(QObject):
                 fail_count = 0
                 failed_ids = []  # [(app_id, error_msg), ...]
                 
-                if process.returncode == 0 and last_json_line:
-                    try:
-                        result_json = json.loads(last_json_line)
-                        for r in result_json.get("results", []):
-                            if r.get("lua", 0) > 0:
-                                success_count += 1
-                            else:
-                                fail_count += 1
-                                app_id = r.get("app_id", "unknown")
-                                error = r.get("error", "无 Lua 文件")
-                                failed_ids.append((app_id, error))
-                    except:
-                        fail_count = len(unlocked_ids)
-                        failed_ids = [(x, "解析失败") for x in unlocked_ids]
+                if process.returncode == 0 and summary and summary.get("success"):
+                    for r in results:
+                        if r.get("lua", 0) > 0:
+                            success_count += 1
+                        else:
+                            fail_count += 1
+                            app_id = r.get("app_id", "unknown")
+                            error = r.get("error", "无 Lua 文件")
+                            failed_ids.append((app_id, error))
                 else:
                     fail_count = len(unlocked_ids)
                     failed_ids = [(x, "下载器异常") for x in unlocked_ids]
@@ -1104,11 +1140,9 @@ class UnlockController(QObject):
                 self.toolCompleted.emit("批量解锁 Lite", message, success_count > 0)
                 
             finally:
-                # 清理临时文件
-                try:
-                    Path(temp_config_path).unlink()
-                except:
-                    pass
+                # 子进程已继承 memfd，父进程侧可直接关闭
+                if config_fd is not None:
+                    os.close(config_fd)
             
             # 刷新界面
             QTimer.singleShot(0, self.view.refreshDisplayRequested.emit)
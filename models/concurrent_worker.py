@@ -13,6 +13,13 @@ from functools import partial
 import time
 
 
+# Lua 合法性检查用的正则，在模块加载时编译一次
+ADDAPPID_PARAMS_PATTERN = re.compile(r'addappid\s*\(([^)]*)\)')
+SETMANIFEST_PARAMS_PATTERN = re.compile(r'setManifestid\s*\(([^)]*)\)')
+ALLOWED_PARAMS_PATTERN = re.compile(r'^[a-zA-Z0-9,\s"\']+$')
+ALLOWED_CHAR_PATTERN = re.compile(r'[a-zA-Z0-9,\s"\']')
+
+
 class ConcurrentWorker:
     """并发工作器"""
     
@@ -193,10 +200,6 @@ class ConcurrentWorker:
         Returns:
             问题文件列表
         """
-        addappid_pattern = re.compile(r'addappid\s*\(([^)]*)\)')
-        setmanifest_pattern = re.compile(r'setManifestid\s*\(([^)]*)\)')
-        allowed_pattern = re.compile(r'^[a-zA-Z0-9,\s"\']+$')
-        
         def check_file(file_path: str) -> Optional[Dict]:
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
@@ -212,11 +215,11 @@ class ConcurrentWorker:
             
             issues = []
             
-            for pattern, name in [(addappid_pattern, 'addappid'), (setmanifest_pattern, 'setManifestid')]:
+            for pattern, name in [(ADDAPPID_PARAMS_PATTERN, 'addappid'), (SETMANIFEST_PARAMS_PATTERN, 'setManifestid')]:
                 for match in pattern.finditer(content):
                     params = match.group(1)
-                    if not allowed_pattern.match(params):
-                        illegal = [c for c in params if not re.match(r'[a-zA-Z0-9,\s"\']', c)]
+                    if not ALLOWED_PARAMS_PATTERN.match(params):
+                        illegal = [c for c in params if not ALLOWED_CHAR_PATTERN.match(c)]
                         issues.append({
                             'function': name,
                             'illegal_chars': list(set(illegal)),
@@ -8,6 +8,19 @@ from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
 
+# addappid / setManifestid 调用，分组: (函数名, 参数)
+ADDAPPID_CALL_PATTERN = re.compile(r'(addappid)\s*\(([^)]*)\)')
+SETMANIFEST_CALL_PATTERN = re.compile(r'(setManifestid)\s*\(([^)]*)\)')
+
+# 参数只允许: 数字、字母、逗号、引号、空格
+ALLOWED_PARAMS_PATTERN = re.compile(r'^[a-zA-Z0-9,\s"\']+$')
+ALLOWED_CHAR_PATTERN = re.compile(r'[a-zA-Z0-9,\s"\']')
+
+# 行首被注释 / 未注释的 setManifestid
+COMMENTED_SETMANIFEST_PATTERN = re.compile(r'^--setManifestid', re.MULTILINE)
+ACTIVE_SETMANIFEST_PATTERN = re.compile(r'^setManifestid', re.MULTILINE)
+
+
 class LuaGenerator:
     """Lua 脚本生成器"""
     
@@ -145,10 +158,10 @@ class LuaGenerator:
         
         if enable:
             # 取消注释: --setManifestid -> setManifestid
-            new_content = re.sub(r'^--setManifestid', 'setManifestid', content, flags=re.MULTILINE)
+            new_content = COMMENTED_SETMANIFEST_PATTERN.sub('setManifestid', content)
         else:
             # 添加注释: setManifestid -> --setManifestid
-            new_content = re.sub(r'^setManifestid', '--setManifestid', content, flags=re.MULTILINE)
+            new_content = ACTIVE_SETMANIFEST_PATTERN.sub('--setManifestid', content)
         
         if new_content == content:
             return True, "无需修改"
@@ -182,20 +195,18 @@ class LuaGenerator:
         issues = []
         
         # 检查 addappid 参数
-        addappid_pattern = re.compile(r'addappid\s*\(([^)]*)\)')
-        for match in addappid_pattern.finditer(content):
-            params = match.group(1)
+        for match in ADDAPPID_CALL_PATTERN.finditer(content):
+            params = match.group(2)
             # 只允许: 数字、字母、逗号、引号、空格
-            if not re.match(r'^[a-zA-Z0-9,\s"\']+$', params):
-                illegal = [c for c in params if not re.match(r'[a-zA-Z0-9,\s"\']', c)]
+            if not ALLOWED_PARAMS_PATTERN.match(params):
+                illegal = [c for c in params if not ALLOWED_CHAR_PATTERN.match(c)]
                 issues.append(f"addappid 包含非法字符: {set(illegal)}")
         
         # 检查 setManifestid 参数
-        setmanifest_pattern = re.compile(r'setManifestid\s*\(([^)]*)\)')
-        for match in setmanifest_pattern.finditer(content):
-            params = match.group(1)
-            if not re.match(r'^[a-zA-Z0-9,\s"\']+$', params):
-                illegal = [c for c in params if not re.match(r'[a-zA-Z0-9,\s"\']', c)]
+        for match in SETMANIFEST_CALL_PATTERN.finditer(content):
+            params = match.group(2)
+            if not ALLOWED_PARAMS_PATTERN.match(params):
+                illegal = [c for c in params if not ALLOWED_CHAR_PATTERN.match(c)]
                 issues.append(f"setManifestid 包含非法字符: {set(illegal)}")
         
         return len(issues) == 0, issues
@@ -218,9 +229,9 @@ class LuaGenerator:
             return f'{func_name}({cleaned})'
         
         # 清理 addappid 参数
-        content = re.sub(r'(addappid)\s*\(([^)]*)\)', clean_params, content)
+        content = ADDAPPID_CALL_PATTERN.sub(clean_params, content)
         # 清理 setManifestid 参数
-        content = re.sub(r'(setManifestid)\s*\(([^)]*)\)', clean_params, content)
+        content = SETMANIFEST_CALL_PATTERN.sub(clean_params, content)
         
         return content
     
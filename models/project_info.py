@@ -6,6 +6,12 @@ import sys
 import time
 from typing import Dict, Any, Optional
 
+# 构建信息由 scripts/build.py 在打包时生成，源码运行时不存在，使用下方默认值
+try:
+    from .build_info import BUILD_INFO
+except ImportError:
+    BUILD_INFO = {}
+
 class ProjectInfo:
     """项目信息管理类，存储和验证程序的基本信息，防止被篡改"""
     
@@ -20,7 +26,8 @@ class ProjectInfo:
         "description_en": "A tool for unlocking Steam games",
         "website": "https://github.com/zfonlyone/unlock_steam",
         "build_date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-        "copyright": f"Copyright © 2026 zfonlyone. All rights reserved."
+        "copyright": f"Copyright © 2026 zfonlyone. All rights reserved.",
+        **BUILD_INFO
     }
     
     # 密钥用于生成和验证签名 - 在实际部署时应使用更安全的方式存储
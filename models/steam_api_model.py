@@ -3,6 +3,8 @@ import random
 import time
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Optional, List, Tuple, Union
 
 
@@ -14,6 +16,13 @@ class SteamApiModel:
         # API请求间隔控制
         self.last_request_time = 0
         self.min_request_interval = 1.0  # 最小请求间隔（秒）
+        self._rate_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        
+        # 复用同一会话的 keep-alive 连接，避免每次请求重新握手 TCP/TLS
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        self.session.mount("https://", adapter)
         
         # 缓存已获取的游戏名称，减少重复请求
         self.name_cache_file = "steam_names_cache.json"
@@ -36,22 +45,24 @@ class SteamApiModel:
     def _save_name_cache(self) -> None:
         """保存游戏名称缓存到文件"""
         try:
-            with open(self.name_cache_file, "w", encoding="utf-8") as f:
-                json.dump(self.names_cache, f, ensure_ascii=False, indent=2)
+            with self._cache_lock:
+                with open(self.name_cache_file, "w", encoding="utf-8") as f:
+                    json.dump(self.names_cache, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"保存游戏名称缓存失败: {e}")
     
     def _wait_for_rate_limit(self) -> None:
-        """等待适当时间以避免请求过于频繁"""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        
-        if elapsed < self.min_request_interval:
-            # 等待至少达到最小间隔时间
-            time.sleep(self.min_request_interval - elapsed + random.uniform(0, 0.5))
-        
-        # 更新最后请求时间
-        self.last_request_time = time.time()
+        """等待适当时间以避免请求过于频繁 (多线程下只串行化请求的发起时刻)"""
+        with self._rate_lock:
+            current_time = time.time()
+            elapsed = current_time - self.last_request_time
+            
+            if elapsed < self.min_request_interval:
+                # 等待至少达到最小间隔时间
+                time.sleep(self.min_request_interval - elapsed + random.uniform(0, 0.5))
+            
+            # 更新最后请求时间
+            self.last_request_time = time.time()
     
     def get_game_name(self, app_id: str, use_cache: bool = True) -> Tuple[bool, str]:
         """获取Steam游戏名称
@@ -89,7 +100,7 @@ class SteamApiModel:
         
         try:
             # 发送请求
-            response = requests.get(url, headers=headers, timeout=15)
+            response = self.session.get(url, headers=headers, timeout=15)
             response.raise_for_status()
             
             # 解析响应
@@ -107,7 +118,8 @@ class SteamApiModel:
             game_name = app_data['data']['name']
             
             # 更新缓存
-            self.names_cache[app_id] = game_name
+            with self._cache_lock:
+                self.names_cache[app_id] = game_name
             self._save_name_cache()
             
             return True, game_name
@@ -121,40 +133,55 @@ class SteamApiModel:
     
     def get_multiple_game_names(self, app_ids: List[str], 
                                callback=None, 
-                               use_cache: bool = True) -> Dict[str, str]:
+                               use_cache: bool = True,
+                               max_workers: int = 4) -> Dict[str, str]:
         """批量获取游戏名称
         
         Args:
             app_ids: 游戏AppID列表
             callback: 处理每个游戏名称后的回调函数，接收(app_id, success, name, progress, total)
             use_cache: 是否使用缓存数据
+            max_workers: 同时进行的请求数，请求发起仍受最小间隔限制
         
         Returns:
             Dict[str, str]: 游戏ID到名称的映射字典（只包含成功获取的名称）
         """
         results = {}
         total = len(app_ids)
+        progress = 0
+        pending = []
         
-        for i, app_id in enumerate(app_ids):
+        for app_id in app_ids:
             # 检查缓存
             if use_cache and app_id in self.names_cache:
                 name = self.names_cache[app_id]
                 results[app_id] = name
+                progress += 1
                 if callback:
-                    callback(app_id, True, name, i + 1, total)
-                continue
+                    callback(app_id, True, name, progress, total)
+            else:
+                pending.append(app_id)
+        
+        if not pending:
+            return results
+        
+        # 并发请求，请求往返时间互相重叠；回调在调用线程中执行
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as executor:
+            futures = {
+                executor.submit(self.get_game_name, app_id, False): app_id  # 避免双重缓存检查
+                for app_id in pending
+            }
             
-            # 获取名称并处理回调
-            success, name = self.get_game_name(app_id, use_cache=False)  # 避免双重缓存检查
-            
-            if success:
-                results[app_id] = name
-            
-            if callback:
-                callback(app_id, success, name, i + 1, total)
-            
-            # 添加随机延迟，避免请求过快
-            time.sleep(random.uniform(0.5, 2.0))
+            for future in as_completed(futures):
+                app_id = futures[future]
+                success, name = future.result()
+                
+                if success:
+                    results[app_id] = name
+                
+                progress += 1
+                if callback:
+                    callback(app_id, success, name, progress, total)
         
         return results
     
@@ -179,7 +206,7 @@ class SteamApiModel:
         }
         
         try:
-            response = requests.get(url, headers=headers, timeout=15)
+            response = self.session.get(url, headers=headers, timeout=15)
             response.raise_for_status()
             
             data = response.json()
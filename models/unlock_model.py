@@ -4,6 +4,7 @@ import asyncio
 from pathlib import Path
 from typing import Dict, Tuple, Callable, List
 import aiofiles
+import orjson
 import os
 import time
 
@@ -11,6 +12,9 @@ import time
 from models import unlock_script
 from models.git_model import GitModel
 
+# Go 下载器输出的单行长度上限
+GO_OUTPUT_LINE_LIMIT = 16 * 1024 * 1024
+
 
 class UnlockModel:
     """游戏解锁功能的模型层"""
@@ -787,9 +791,6 @@ class UnlockModel:
         Returns:
             {app_id: (success, message)} 字典
         """
-        import subprocess
-        import json
-        
         steam_path = self.get_steam_path()
         if not steam_path.exists():
             return {app_id: (False, "Steam 路径无效") for app_id in app_ids}
@@ -852,92 +853,122 @@ class UnlockModel:
                     "direct_mode": True
                 }
                 
-                import tempfile
-                import os
+                config_bytes = orjson.dumps(config_dict)
                 
-                # 使用临时文件传递配置，彻底解决 Windows Stdin 管道容量限制问题
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as tmp:
-                    json.dump(config_dict, tmp)
-                    temp_config_path = tmp.name
+                # 配置不落盘：Linux 通过 memfd 传递 (子进程读取 /proc/self/fd/N)，
+                # 其他平台 (Windows) 通过 stdin 异步写入，drain 负责背压，不受管道容量限制
+                config_fd = None
+                feed_task = None
+                repair_tasks = {}
+                if hasattr(os, "memfd_create"):
+                    config_fd = os.memfd_create("unlock_config", 0)
+                    os.write(config_fd, config_bytes)
+                    os.lseek(config_fd, 0, os.SEEK_SET)
+                    go_args = ["-config", f"/proc/self/fd/{config_fd}"]
+                else:
+                    go_args = []
                 
                 try:
                     # 调用 Go 下载器
-                    import time
-                    start_time = time.time()
-                    
-                    process = subprocess.Popen(
-                        [str(go_binary), "-config", temp_config_path],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
+                    # 使用 asyncio 子进程，读取输出时不阻塞事件循环
+                    process = await asyncio.create_subprocess_exec(
+                        str(go_binary), *go_args,
+                        stdin=asyncio.subprocess.PIPE if config_fd is None else asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.STDOUT,
                         startupinfo=self.startupinfo,
-                        text=False
+                        pass_fds=(config_fd,) if config_fd is not None else (),
+                        limit=GO_OUTPUT_LINE_LIMIT  # 旧版下载器的结果 JSON 为单行输出，放宽行长度限制
                     )
                     
-                    # 实时读取输出
-                    last_json_line = ""
+                    if config_fd is None:
+                        # 配置写入与输出读取并行进行，任一侧管道写满都不会互相阻塞
+                        async def feed_config():
+                            try:
+                                process.stdin.write(config_bytes)
+                                await process.stdin.drain()
+                                process.stdin.close()
+                            except (BrokenPipeError, ConnectionResetError):
+                                pass
+                        feed_task = asyncio.create_task(feed_config())
+                    
+                    # 实时读取输出 (NDJSON: 每个游戏一行 result，结束时一行 summary)
+                    summary = None
                     results = {}
                     api_remaining = 5000
                     
-                    while True:
-                        line = process.stdout.readline()
-                        if not line and process.poll() is not None:
-                            break
-                        
-                        line_str = line.decode('utf-8', errors='ignore').strip()
-                        if not line_str:
+                    # --- Python 异步补漏：失败项一出现就开始补全，与下载尾部重叠 ---
+                    sem = asyncio.Semaphore(20)
+                    async def repair(aid):
+                        async with sem:
+                            return await self.unlock_game_async(aid, "", None)
+                    
+                    def record_result(r):
+                        aid = r.get("app_id", "")
+                        err = r.get("error", "")
+                        lua = r.get("lua", 0)
+                        mf = r.get("manifest", 0)
+                        if err: results[aid] = (False, err)
+                        elif lua > 0: results[aid] = (True, f"成功 (Lua={lua}, Manifest={mf})")
+                        else: results[aid] = (False, "缺失 Lua")
+                        if not results[aid][0] and aid not in repair_tasks:
+                            repair_tasks[aid] = asyncio.create_task(repair(aid))
+                    
+                    async for line in process.stdout:
+                        # 热循环内保持 bytes 处理，只在需要展示时才解码
+                        line = line.strip()
+                        if not line:
                             continue
                             
-                        # 尝试解析 JSON 结果
-                        if line_str.startswith('{') and '"results"' in line_str:
-                            last_json_line = line_str
-                            continue
+                        # 解析 JSON 帧，按 type 分派
+                        if line.startswith(b'{'):
+                            try:
+                                frame = orjson.loads(line)
+                            except ValueError:
+                                frame = None
+                            if isinstance(frame, dict):
+                                frame_type = frame.get("type")
+                                if frame_type == "result":
+                                    record_result(frame)
+                                elif frame_type == "summary" or "success" in frame:
+                                    # 旧版下载器在结束时输出带 results 的单行汇总 JSON
+                                    for r in frame.get("results") or []:
+                                        record_result(r)
+                                    summary = frame
+                                continue
                         
                         # 反馈给 UI
                         if progress_callback:
-                            msg = line_str
-                            if "[DOWNLOAD_SUCCESS]" in line_str:
-                                msg = "✅ 成功: " + line_str.split("]")[-1].strip()
-                            elif "[DOWNLOAD_FAIL]" in line_str:
-                                msg = "❌ 失败: " + line_str.split("]")[-1].strip()
-                            elif "[PROGRESS]" in line_str:
+                            if line.startswith(b"[PROGRESS]"):
                                 # [PROGRESS] 100/500 -> 提取百分比
                                 try:
-                                    p_str = line_str.split("]")[-1].strip()
-                                    curr, total = map(int, p_str.split("/"))
-                                    percent = int(curr / total * 100)
-                                    progress_callback(f"批量进度: {p_str}", percent)
+                                    curr, total = line[10:].split(b"/")
+                                    curr, total = int(curr), int(total)
+                                    progress_callback(f"批量进度: {curr}/{total}", curr * 100 // total)
                                     continue
-                                except: pass
+                                except (ValueError, ZeroDivisionError): pass
+                            
+                            line_str = line.decode('utf-8', errors='ignore')
+                            msg = line_str
+                            if line.startswith(b"[DOWNLOAD_SUCCESS]"):
+                                msg = "✅ 成功: " + line_str.split("]")[-1].strip()
+                            elif line.startswith(b"[DOWNLOAD_FAIL]"):
+                                msg = "❌ 失败: " + line_str.split("]")[-1].strip()
                                 
                             progress_callback(msg, -1)
                     
-                    process.wait()
+                    await process.wait()
+                    if feed_task:
+                        await feed_task
                     
-                    if process.returncode == 0 and last_json_line:
-                        result_json = json.loads(last_json_line)
-                        for r in result_json.get("results", []):
-                            aid = r.get("app_id", "")
-                            err = r.get("error", "")
-                            lua = r.get("lua", 0)
-                            mf = r.get("manifest", 0)
-                            if err: results[aid] = (False, err)
-                            elif lua > 0: results[aid] = (True, f"成功 (Lua={lua}, Manifest={mf})")
-                            else: results[aid] = (False, "缺失 Lua")
+                    if process.returncode == 0 and summary and summary.get("success"):
+                        api_remaining = summary.get("api_remaining", api_remaining)
                         
-                        api_remaining = result_json.get("api_remaining", api_remaining)
-                        
-                        # --- Python 异步补漏 ---
-                        missing_ids = [aid for aid, (succ, msg) in results.items() if not succ]
-                        if missing_ids:
-                            if progress_callback: progress_callback(f"正在补全 {len(missing_ids)} 个缺失项...", -1)
-                            sem = asyncio.Semaphore(20)
-                            async def repair(aid):
-                                async with sem:
-                                    return await self.unlock_game_async(aid, "", None)
-                            
-                            repair_tasks = [repair(aid) for aid in missing_ids]
-                            repair_res = await asyncio.gather(*repair_tasks)
-                            for aid, (succ, msg) in zip(missing_ids, repair_res):
+                        # 等待仍在进行的补漏任务
+                        if repair_tasks:
+                            if progress_callback: progress_callback(f"正在补全 {len(repair_tasks)} 个缺失项...", -1)
+                            repair_res = await asyncio.gather(*repair_tasks.values())
+                            for aid, (succ, msg) in zip(repair_tasks, repair_res):
                                 if succ: results[aid] = (True, f"已补齐: {msg}")
                                 
                         if progress_callback:
@@ -949,10 +980,12 @@ class UnlockModel:
                         print(f"Go 下载器未返回预期结果 (退出码 {process.returncode})")
                         
                 finally:
-                    # 确保清理临时文件
-                    if os.path.exists(temp_config_path):
-                        try: os.remove(temp_config_path)
-                        except: pass
+                    # 子进程已继承 memfd，父进程侧可直接关闭
+                    if config_fd is not None:
+                        os.close(config_fd)
+                    # Go 下载器失败时改走 Python 回退方案，取消未完成的补漏任务
+                    for task in repair_tasks.values():
+                        task.cancel()
             except Exception as e:
                 print(f"Go 下载器执行监控异常: {e}")
                 import traceback
@@ -976,23 +1009,33 @@ class UnlockModel:
                 download_concurrency=30  # 降低并发保护磁盘 IO
             )
             
-            batch_result = await downloader.download_batch(app_ids)
-            
+            start_time = time.time()
             results = {}
-            for r in batch_result.results:
+            fallback_sem = asyncio.Semaphore(10)
+            fallback_tasks = {}
+            
+            async def fallback(aid):
+                async with fallback_sem:
+                    return await self.unlock_game_direct(aid)
+            
+            # 逐个消费下载结果，兜底任务与剩余下载重叠进行
+            async for r in downloader.iter_batch(app_ids):
                 if r.error:
                     results[r.app_id] = (False, r.error)
                 elif r.lua_count > 0:
                     results[r.app_id] = (True, f"成功 (Lua={r.lua_count}, Manifest={r.manifest_count})")
                 else:
                     # 自动生成基础 Lua 兜底
-                    succ, msg = await self.unlock_game_direct(r.app_id)
-                    results[r.app_id] = (succ, msg if succ else "未找到 Lua 且生成失败")
+                    fallback_tasks[r.app_id] = asyncio.create_task(fallback(r.app_id))
+            
+            for aid, task in fallback_tasks.items():
+                succ, msg = await task
+                results[aid] = (succ, msg if succ else "未找到 Lua 且生成失败")
             
             if progress_callback:
                 success_count = sum(1 for s, _ in results.values() if s)
                 progress_callback(
-                    f"处理完成! 成功: {success_count}/{len(app_ids)}, 耗时: {batch_result.total_time:.1f}秒",
+                    f"处理完成! 成功: {success_count}/{len(app_ids)}, 耗时: {time.time() - start_time:.1f}秒",
                     100
                 )
             
@@ -1,5 +1,6 @@
 import os
 import sys
+import shutil
 import asyncio
 import aiofiles
 import json
@@ -17,13 +18,22 @@ class Logger:
 
 LOG = Logger()
 
+# Concurrent local file copies; kept separate from any network-side limit
+COPY_CONCURRENCY = 16
+
+
+async def _copy_one(src: Path, dst: Path, sem: asyncio.Semaphore) -> None:
+    """Copy a single file in a worker thread, bounded by the shared copy semaphore"""
+    async with sem:
+        # shutil.copyfile uses the kernel fast-copy path where available
+        await asyncio.to_thread(shutil.copyfile, src, dst)
+
 
 async def parse_key_vdf(file_path: Path) -> List[Tuple[str, str]]:
     """Parse a key.vdf file to extract depot IDs and decryption keys"""
     try:
-        async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-            content = await f.read()
-        
+        # key.vdf is tiny: one thread hop for open+read+close beats an aiofiles round-trip per call
+        content = await asyncio.to_thread(file_path.read_text, encoding="utf-8")
         depots = vdf.loads(content)["depots"]
         return [(d_id, d_info["DecryptionKey"]) for d_id, d_info in depots.items()]
     except Exception:
@@ -43,116 +53,149 @@ def extract_depot_manifest_info(filename: str) -> Tuple[str, str]:
     return depot_id, manifest_id
 
 
-async def process_manifest_folder(folder_path: Path) -> Tuple[List[Tuple[str, str]], Dict[str, List[str]]]:
-    """Process a folder containing manifest and key files"""
+async def process_manifest_folder(folder_path: Path, with_index: bool = False) -> Tuple:
+    """Process a folder containing manifest and key files
+    
+    Returns (depot_data, depot_map); with with_index=True a third item, the
+    manifest filename -> path index built during the same walk, is appended.
+    """
     depot_data = []
     depot_map = {}
+    key_files = []
+    manifest_files = []
+    name_index = {}
+    
+    # Walk the tree once and bucket files by type
+    for root, _, files in os.walk(folder_path):
+        for name in files:
+            if name == "key.vdf":
+                key_files.append(Path(root) / name)
+            elif name.endswith(".manifest"):
+                file = Path(root) / name
+                manifest_files.append(file)
+                name_index.setdefault(name, file)
     
     # Look for key.vdf files first
-    for file in folder_path.glob("**/key.vdf"):
+    for file in key_files:
         keys = await parse_key_vdf(file)
         depot_data.extend(keys)
         LOG.info(f"Parsed key file: {file.name} - Found {len(keys)} depot keys")
     
     # Process manifest files
-    for file in folder_path.glob("**/*.manifest"):
+    for file in manifest_files:
         depot_id, manifest_id = extract_depot_manifest_info(file.name)
         if depot_id and manifest_id:
-            depot_map.setdefault(depot_id, []).append(manifest_id)
+            # Parse the numeric ID once so sorting compares plain ints; the set drops
+            # duplicates from mirrored or nested copies of the same manifest
+            depot_map.setdefault(depot_id, set()).add((int(manifest_id), manifest_id))
             LOG.info(f"Found manifest: {file.name}")
     
     # Sort manifest IDs by newest first (highest number)
-    for depot_id in depot_map:
-        depot_map[depot_id].sort(key=lambda x: int(x), reverse=True)
+    for depot_id, entries in depot_map.items():
+        depot_map[depot_id] = [manifest_id for _, manifest_id in sorted(entries, reverse=True)]
     
+    if with_index:
+        return depot_data, depot_map, name_index
     return depot_data, depot_map
 
 
-async def copy_manifests_to_steam(source_folder: Path, steam_path: Path, depot_map: Dict[str, List[str]]) -> None:
-    """Copy manifest files to Steam's depotcache directory"""
+async def copy_manifests_to_steam(source_folder: Path, steam_path: Path, depot_map: Dict[str, List[str]],
+                                  name_index: Dict[str, Path] = None) -> None:
+    """Copy manifest files to Steam's depotcache directory, looking sources up in a filename index"""
     depot_cache = steam_path/ "config" / "depotcache"
-    depot_cache.mkdir(exist_ok=True)
     
+    # Build the filename -> path index in one pass if the caller did not supply one
+    if name_index is None:
+        name_index = {}
+        for file in source_folder.rglob("*.manifest"):
+            name_index.setdefault(file.name, file)
+    
+    sem = asyncio.Semaphore(COPY_CONCURRENCY)
+    tasks = []
     for depot_id, manifest_ids in depot_map.items():
         for manifest_id in manifest_ids:
             manifest_filename = f"{depot_id}_{manifest_id}.manifest"
-            source_file = None
-            
-            # Search for the manifest file in the source folder
-            for file in source_folder.glob(f"**/{manifest_filename}"):
-                source_file = file
-                break
-            
+            source_file = name_index.get(manifest_filename)
             if source_file:
                 dest_file = depot_cache / manifest_filename
                 if dest_file.exists():
                     LOG.warning(f"Manifest already exists: {dest_file}")
                     continue
                 
-                # Copy the file
-                async with aiofiles.open(source_file, "rb") as src:
-                    content = await src.read()
-                    async with aiofiles.open(dest_file, "wb") as dst:
-                        await dst.write(content)
-                LOG.info(f"Copied manifest: {manifest_filename}")
+                tasks.append(_copy_one(source_file, dest_file, sem))
+                LOG.info(f"Copying manifest: {manifest_filename}")
+    
+    await asyncio.gather(*tasks)
 
 
 async def setup_steamtools(depot_data: List[Tuple[str, str]], app_id: str, depot_map: Dict[str, List[str]], steam_path: Path) -> bool:
     """Configure SteamTools for game unlocking"""
     st_path = steam_path / "config" / "stplug-in"
-    st_path.mkdir(exist_ok=True)
 
     # Create Lua script content
-    lua_content = f'addappid({app_id}, 1, "None")\n'
+    parts = [f'addappid({app_id}, 1, "None")\n']
     for d_id, d_key in depot_data:
         if d_id in depot_map and depot_map[d_id]:
             for manifest_id in depot_map[d_id]:
-                lua_content += f'addappid({d_id}, 1, "{d_key}")\nsetManifestid({d_id},"{manifest_id}")\n'
+                parts.append(f'addappid({d_id}, 1, "{d_key}")\nsetManifestid({d_id},"{manifest_id}")\n')
                 break
         else:
-            lua_content += f'addappid({d_id}, 1, "{d_key}")\n'
+            parts.append(f'addappid({d_id}, 1, "{d_key}")\n')
+    lua_content = "".join(parts)
 
     # Write the Lua file
     lua_file = st_path / f"{app_id}.lua"
     try:
-        async with aiofiles.open(lua_file, "w") as f:
-            await f.write(lua_content)
+        async with aiofiles.open(lua_file, "wb") as f:
+            await f.write(lua_content.encode("utf-8"))
         return True
     except:
         return False
 
 
+def _rewrite_applist(applist_dir: Path, depot_ids: List[str]) -> None:
+    """Delete existing AppList *.txt files and write one entry per depot ID"""
+    with os.scandir(applist_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".txt") and entry.is_file():
+                os.unlink(entry.path)
+    
+    for idx, d_id in enumerate(depot_ids, 1):
+        with open(os.path.join(applist_dir, f"{idx}.txt"), "w") as f:
+            f.write(str(d_id))
+
+
 async def setup_greenluma(depot_data: List[Tuple[str, str]], steam_path: Path) -> bool:
     """Configure GreenLuma for game unlocking"""
     applist_dir = steam_path / "AppList"
-    applist_dir.mkdir(exist_ok=True)
     
-    # Delete existing AppList files
-    for f in applist_dir.glob("*.txt"):
-        f.unlink()
-    
-    # Create new AppList files
-    for idx, (d_id, _) in enumerate(depot_data, 1):
-        (applist_dir / f"{idx}.txt").write_text(str(d_id))
-        LOG.info(f"Created AppList entry: {idx}.txt with depot ID {d_id}")
+    # Replace AppList files in one worker-thread hop
+    await asyncio.to_thread(_rewrite_applist, applist_dir, [d_id for d_id, _ in depot_data])
+    LOG.info(f"Created {len(depot_data)} AppList entries")
     
     # Update Steam config.vdf with decryption keys
     config_path = steam_path / "config" / "config.vdf"
     if config_path.exists():
         try:
-            async with aiofiles.open(config_path, "r") as f:
-                content = vdf.loads(await f.read())
+            content = vdf.loads(await asyncio.to_thread(config_path.read_text))
             
-            # Add decryption keys to config
-            content.setdefault("depots", {}).update(
-                {d_id: {"DecryptionKey": d_key} for d_id, d_key in depot_data}
-            )
+            # Only touch depots whose key is missing or different
+            current = content.setdefault("depots", {})
+            updates = {
+                d_id: {"DecryptionKey": d_key}
+                for d_id, d_key in depot_data
+                if current.get(d_id, {}).get("DecryptionKey") != d_key
+            }
+            if not updates:
+                LOG.info("Steam config already contains all depot keys")
+                return True
+            current.update(updates)
             
             # Write updated config
             async with aiofiles.open(config_path, "w") as f:
                 await f.write(vdf.dumps(content))
                 
-            LOG.info(f"Updated Steam config with {len(depot_data)} depot keys")
+            LOG.info(f"Updated Steam config with {len(updates)} depot keys")
         except Exception as e:
             LOG.error(f"Failed to update Steam config: {str(e)}")
             return False
@@ -164,60 +207,58 @@ async def setup_greenluma(depot_data: List[Tuple[str, str]], steam_path: Path) -
 
 
 async def unlock_process(steam_path: Path, manifests_path: Path, app_id: str) -> bool:
-    """直接复制清单文件到Steam目录"""
+    """直接复制清单文件到Steam目录（depotcache 目录需由调用方预先创建）"""
     # 复制清单文件到depot缓存
     depot_cache = steam_path / "config" / "depotcache"
-    depot_cache.mkdir(exist_ok=True)
     
-    # 复制所有manifest文件
+    # 并发复制所有manifest文件，单个文件失败不影响其他文件
     try:
+        sem = asyncio.Semaphore(COPY_CONCURRENCY)
+        tasks = []
+        seen = set()
         for manifest_file in manifests_path.glob("**/*.manifest"):
+            # 子目录中的同名清单只复制第一个，避免并发写同一个目标文件
+            if manifest_file.name in seen:
+                continue
+            seen.add(manifest_file.name)
             dest_file = depot_cache / manifest_file.name
             if not dest_file.exists():
-                try:
-                    async with aiofiles.open(manifest_file, "rb") as src:
-                        content = await src.read()
-                        async with aiofiles.open(dest_file, "wb") as dst:
-                            await dst.write(content)
-                except:
-                    pass
+                tasks.append(_copy_one(manifest_file, dest_file, sem))
+        await asyncio.gather(*tasks, return_exceptions=True)
         return True
     except:
         return False
 
 
 async def unlock_process_lua(steam_path: Path, manifests_path: Path, app_id: str) -> bool:
-    """直接复制Lua文件到Steam目录"""
+    """直接复制Lua文件到Steam目录（stplug-in/depotcache 目录需由调用方预先创建）"""
     # 设置路径
     st_path = steam_path / "config" / "stplug-in"
-    st_path.mkdir(exist_ok=True)
     
     # 复制app_id.lua文件
     source_lua = manifests_path / f"{app_id}.lua"
     if source_lua.exists():
         lua_file = st_path / f"{app_id}.lua"
         try:
-            async with aiofiles.open(source_lua, "rb") as src:
-                content = await src.read()
-                async with aiofiles.open(lua_file, "wb") as dst:
-                    await dst.write(content)
+            await asyncio.to_thread(shutil.copyfile, source_lua, lua_file)
         except:
             return False
     
     # 同时复制清单文件
     depot_cache = steam_path / "config" / "depotcache"
-    depot_cache.mkdir(exist_ok=True)
     
+    sem = asyncio.Semaphore(COPY_CONCURRENCY)
+    tasks = []
+    seen = set()
     for manifest_file in manifests_path.glob("**/*.manifest"):
+        # 子目录中的同名清单只复制第一个，避免并发写同一个目标文件
+        if manifest_file.name in seen:
+            continue
+        seen.add(manifest_file.name)
         dest_file = depot_cache / manifest_file.name
         if not dest_file.exists():
-            try:
-                async with aiofiles.open(manifest_file, "rb") as src:
-                    content = await src.read()
-                    async with aiofiles.open(dest_file, "wb") as dst:
-                        await dst.write(content)
-            except:
-                pass
+            tasks.append(_copy_one(manifest_file, dest_file, sem))
+    await asyncio.gather(*tasks, return_exceptions=True)
     
     return True
 
@@ -299,7 +340,7 @@ async def main():
         LOG.error("GreenLuma not detected")
         return
     #验证密钥
-    depot_data, depot_map = await process_manifest_folder(manifests_path)
+    depot_data, depot_map, name_index = await process_manifest_folder(manifests_path, with_index=True)
 
     if not depot_data:
         LOG.error("No depot keys found in the manifest folder")
@@ -307,8 +348,13 @@ async def main():
 
     LOG.info(f"Found {len(depot_data)} depot keys and {sum(len(v) for v in depot_map.values())} manifest files")
 
+    # Target directories are created once here; the helpers assume they exist
+    (steam_path / "config" / "depotcache").mkdir(exist_ok=True)
+    if tool_choice == 2:
+        (steam_path / "AppList").mkdir(exist_ok=True)
+
     # Copy manifests to Steam's depotcache
-    await copy_manifests_to_steam(manifests_path, steam_path, depot_map)
+    await copy_manifests_to_steam(manifests_path, steam_path, depot_map, name_index)
 
     # Setup selected unlock tool
     success = False
@@ -1,6 +1,6 @@
 """
 Build Script - Package application into exe
-Usage: python build.py
+Usage: python build.py [--fresh]
 
 Features:
 - Auto-install missing dependencies
@@ -14,7 +14,11 @@ import shutil
 import subprocess
 import re
 import io
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from importlib.metadata import distribution, PackageNotFoundError
 from pathlib import Path
 
 # Fix encoding for Windows CI (cp1252 -> utf-8)
@@ -35,8 +39,15 @@ REQUIRED_PACKAGES = [
     "aiohttp",
     "aiofiles",
     "requests",
+    "orjson",
 ]
 
+# 记录上次转换图标时 PNG 的 sha256，避免 mtime 变化导致重复转换
+ICON_HASH_FILE = Path(".icon_hash")
+
+# 需要打包的 DLL: sqlite3.dll, libssl-*.dll, libcrypto-*.dll
+DLL_PATTERN = re.compile(r'^(sqlite3|libssl-.*|libcrypto-.*)\.dll$', re.IGNORECASE)
+
 
 def install_package(package: str) -> bool:
     """安装单个包"""
@@ -60,27 +71,36 @@ def ensure_dependencies():
     missing = []
     for package in REQUIRED_PACKAGES:
         try:
-            __import__(package.lower().replace("-", "_"))
-        except ImportError:
+            distribution(package)
+        except PackageNotFoundError:
             missing.append(package)
     
     if missing:
         print(f"发现 {len(missing)} 个缺失的依赖，正在安装...")
-        for package in missing:
-            install_package(package)
+        # 一次 pip 调用安装全部缺失包，失败时再逐个安装以定位具体问题
+        try:
+            subprocess.check_call(
+                [sys.executable, "-m", "pip", "install", "-q", *missing],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except Exception:
+            # 多个 pip 进程同时写 site-packages 会互相冲突，逐个顺序安装
+            print("  批量安装失败，改为逐个安装...")
+            for package in missing:
+                install_package(package)
     else:
         print("✓ 所有依赖已就绪")
     
-    # 检查并移除有问题的 pathlib
+    # 检查并移除有问题的 pathlib (进程内查询元数据，仅在存在时调用 pip)
     try:
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "show", "pathlib"],
-            capture_output=True, text=True
-        )
-        if result.returncode == 0:
-            print("发现多余的 pathlib 包，正在移除...")
-            subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "pathlib"],
-                          capture_output=True)
+        distribution("pathlib")
+    except PackageNotFoundError:
+        return
+    print("发现多余的 pathlib 包，正在移除...")
+    try:
+        subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", "pathlib"],
+                      capture_output=True)
     except:
         pass
 
@@ -96,20 +116,22 @@ def find_dll_files():
         python_dir,
     ]
     
-    needed_dlls = ["sqlite3.dll", "libssl-*.dll", "libcrypto-*.dll"]
     found_dlls = []
+    seen = set()
     
-    for dll_pattern in needed_dlls:
-        for search_path in dll_search_paths:
-            if not search_path.exists():
-                continue
-            
-            import glob
-            matches = glob.glob(str(search_path / dll_pattern))
-            for match in matches:
-                if match not in found_dlls:
-                    found_dlls.append(match)
-                    print(f"  找到: {match}")
+    # 每个目录只扫描一次，用预编译的正则匹配所有需要的 DLL
+    for search_path in dll_search_paths:
+        if not search_path.is_dir():
+            continue
+        
+        with os.scandir(search_path) as it:
+            for entry in it:
+                if not DLL_PATTERN.match(entry.name) or not entry.is_file():
+                    continue
+                if entry.path not in seen:
+                    seen.add(entry.path)
+                    found_dlls.append(entry.path)
+                    print(f"  找到: {entry.path}")
     
     return found_dlls
 
@@ -141,18 +163,17 @@ def build_go_downloader():
     # 编译
     print(f"正在编译 {go_source_file}...")
     try:
+        # 继承标准输出/错误，编译错误直接输出到终端
         result = subprocess.run(
             ["go", "build", "-ldflags", "-s -w", "-o", "../../downloader.exe", "main.go"],
-            cwd=str(go_source_dir),
-            capture_output=True,
-            text=True
+            cwd=str(go_source_dir)
         )
         
         if result.returncode == 0:
             print(f"✓ Go 下载器编译成功: {go_output}")
             return go_output
         else:
-            print(f"✗ Go 编译失败: {result.stderr}")
+            print(f"✗ Go 编译失败 (退出码 {result.returncode})，错误信息见上方输出")
             return None
     except Exception as e:
         print(f"✗ Go 编译出错: {e}")
@@ -160,37 +181,62 @@ def build_go_downloader():
 
 
 def update_project_info():
-    """更新项目信息"""
+    """生成构建信息模块 (由 models/project_info.py 导入并覆盖默认值)"""
     print("\n=== 更新项目信息 ===")
     
-    project_info_path = Path("models/project_info.py")
-    if not project_info_path.exists():
-        print(f"⚠ 找不到项目信息文件: {project_info_path}")
-        return
-    
-    content = project_info_path.read_text(encoding="utf-8")
-    
-    replacements = [
-        (r'("version"\s*:\s*)"[\d\.]+"', f'\\1"{VERSION}"'),
-        (r'("build_date"\s*:\s*)"[^"]*"', f'\\1"{BUILD_DATE}"'),
-        (r'("author"\s*:\s*)"[^"]*"', f'\\1"{AUTHOR}"'),
-        (r'("copyright"\s*:\s*f*)"[^"]*"', f'\\1"{COPYRIGHT}"'),
-    ]
-    
-    for pattern, replacement in replacements:
-        content = re.sub(pattern, replacement, content)
-    
-    project_info_path.write_text(content, encoding="utf-8")
+    build_info = {
+        "version": VERSION,
+        "build_date": BUILD_DATE,
+        "author": AUTHOR,
+        "copyright": COPYRIGHT,
+    }
+    build_info_path = Path("models/build_info.py")
+    build_info_path.write_text(
+        "# 此文件由 scripts/build.py 自动生成，请勿手动修改\n"
+        f"BUILD_INFO = {build_info!r}\n",
+        encoding="utf-8"
+    )
     print(f"✓ 版本={VERSION}, 构建日期={BUILD_DATE}")
 
 
-def cleanup():
-    """清理之前的构建文件"""
+def remove_trees(folders, workers: int = 8):
+    """并行删除多个目录树：文件交给线程池删除，目录再自底向上移除"""
+    files = []
+    dirs = []
+    for folder in folders:
+        for root, dirnames, filenames in os.walk(folder):
+            dirs.append(root)
+            files.extend(os.path.join(root, name) for name in filenames)
+            # 指向目录的符号链接不会被遍历，按文件删除
+            files.extend(os.path.join(root, name) for name in dirnames
+                         if os.path.islink(os.path.join(root, name)))
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(os.unlink, files))
+        for d in reversed(dirs):
+            os.rmdir(d)
+    except OSError:
+        # 出现只读文件等情况时回退到 shutil.rmtree，保留原有的报错行为
+        for folder in folders:
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+
+
+def cleanup(fresh: bool = False):
+    """清理之前的构建文件
+
+    Args:
+        fresh: 为 True 时同时删除 build/，否则保留 PyInstaller 分析缓存做增量构建
+    """
     print("\n=== 清理旧文件 ===")
-    for folder in ['build', 'dist']:
-        if os.path.exists(folder):
-            shutil.rmtree(folder)
-            print(f"  删除 {folder}/")
+    folders = ['build', 'dist'] if fresh else ['dist']
+    if not fresh:
+        print("  增量构建 (使用 --fresh 进行完全重新构建)")
+    folders = [f for f in folders if os.path.exists(f)]
+    remove_trees(folders)
+    for folder in folders:
+        print(f"  删除 {folder}/")
     
     for spec in Path(".").glob("*.spec"):
         spec.unlink()
@@ -233,12 +279,30 @@ VSVersionInfo(
     icon_ico = Path("app_icon.ico")
     
     if icon_png.exists():
-        # 尝试将 PNG 转换为 ICO
-        if not icon_ico.exists():
+        # 尝试将 PNG 转换为 ICO (仅在 PNG 有变化时才导入 Pillow)
+        png_hash = None
+        if icon_ico.exists() and icon_ico.stat().st_mtime >= icon_png.stat().st_mtime:
+            need_convert = False
+        else:
+            png_hash = hashlib.sha256(icon_png.read_bytes()).hexdigest()
+            if not icon_ico.exists():
+                need_convert = True
+            elif ICON_HASH_FILE.exists():
+                need_convert = ICON_HASH_FILE.read_text().strip() != png_hash
+            else:
+                # 已有 ICO 但没有记录，沿用现有 ICO 并记下当前 PNG 的哈希
+                ICON_HASH_FILE.write_text(png_hash)
+                need_convert = False
+            if not need_convert:
+                # 内容未变，只是 mtime 变了，刷新 ICO 时间戳以便下次走快速路径
+                os.utime(icon_ico)
+        
+        if need_convert:
             try:
                 from PIL import Image
                 img = Image.open(icon_png)
                 img.save(icon_ico, format='ICO', sizes=[(256, 256), (128, 128), (64, 64), (48, 48), (32, 32), (16, 16)])
+                ICON_HASH_FILE.write_text(png_hash)
                 print(f"✓ 已将 {icon_png} 转换为 {icon_ico}")
             except ImportError:
                 print("⚠ 未安装 Pillow，使用 pip install Pillow 可启用图标转换")
@@ -255,13 +319,13 @@ VSVersionInfo(
         f"--name=SteamGameUnlocker-{VERSION}",
         "--windowed",
         "--onefile",
-        "--clean",
         "--noconfirm",
         f"--version-file={version_file}",
         # 隐藏导入
         "--hidden-import=sqlite3",
         "--hidden-import=aiohttp",
         "--hidden-import=aiofiles",
+        "--hidden-import=orjson",
         "--hidden-import=asyncio",
     ]
     
@@ -291,16 +355,24 @@ VSVersionInfo(
         ("tools/complete_manifests.py", "tools"),
     ]
 
+    # 每个目录只列举一次，之后的存在性检查都是集合查询
+    present = {}
     for src, dst in data_files:
-
-        if os.path.exists(src):
+        parent, name = os.path.split(src)
+        if parent not in present:
+            try:
+                with os.scandir(parent or ".") as it:
+                    present[parent] = {entry.name for entry in it}
+            except OSError:
+                present[parent] = set()
+        if name in present[parent]:
             cmd.extend(["--add-data", f"{src}{os.pathsep}{dst}"])
     
     cmd.append("app.py")
     
     print(f"执行 PyInstaller...")
     try:
-        subprocess.check_call(cmd)
+        subprocess.run(cmd, check=True)
     finally:
         if version_file.exists():
             version_file.unlink()
@@ -321,8 +393,18 @@ def copy_go_downloader():
     return False
 
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Steam游戏解锁器打包工具")
+    parser.add_argument("--fresh", action="store_true",
+                        help="删除 build/ 缓存，完全重新构建")
+    return parser.parse_args()
+
+
 def main():
     """主函数"""
+    args = parse_args()
+    
     print(f"{'='*50}")
     print(f"  Steam游戏解锁器打包工具 v{VERSION}")
     print(f"{'='*50}")
@@ -334,7 +416,7 @@ def main():
     update_project_info()
     
     # 3. 清理旧文件
-    cleanup()
+    cleanup(args.fresh)
     
     # 4. 查找 DLL
     dlls = find_dll_files()
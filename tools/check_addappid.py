@@ -6,7 +6,8 @@
 直接调用:
     from tools.check_addappid import run_check, run_fix
     result = run_check(target_dir, progress_callback)
-    fix_result = run_fix(target_dir, progress_callback)
+    fix_result = run_fix(target_dir, progress_callback,
+                         candidate_files=[p[0] for p in result["problems"]])
 
 命令行:
     python check_addappid.py [目录]
@@ -19,11 +20,58 @@ import re
 # 允许的字符: 数字、字母、逗号、引号、空格
 ALLOWED_PATTERN = re.compile(r'^[a-zA-Z0-9,\s"\']+$')
 ALLOWED_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789,"\' ')
+# 修复时删除的字符: 允许字符以外的全部字符
+ILLEGAL_PATTERN = re.compile(r'[^a-zA-Z0-9,"\' ]')
 
-# 匹配 addappid(...) 和 setManifestid(...) 的内容
+# 匹配 addappid(...) 和 setManifestid(...) 的内容，两种函数分别扫描
+# (合并成一个正则会吞掉嵌套在另一函数参数中的调用)
 ADDAPPID_PATTERN = re.compile(r'addappid\s*\(([^)]*)\)')
 SETMANIFEST_PATTERN = re.compile(r'setManifestid\s*\(([^)]*)\)')
 
+# 字节级预检: 函数名到其后第一个 "(" 之间的内容，以及到 ")" 为止的参数
+# 函数名与括号之间不限定为空白，str 正则 \s 匹配的 Unicode 空白也能覆盖
+CALL_PATTERN_B = re.compile(rb'(?:addappid|setManifestid)([^(]*)\(([^)]*)\)')
+# 参数只含这些字节时一定不会被报告 (非 ASCII 字节交给解码后的检查判断)
+CHECK_SAFE_BYTES = b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789,"\' \t\n\x0b\x0c\r'
+# 参数只含这些字节且函数名紧跟括号时一定无需修复
+FIX_SAFE_BYTES = b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789,"\' '
+
+# 扫描时跳过的目录
+SKIP_DIRS = {'.git', '__pycache__', 'node_modules'}
+
+
+def has_suspect_calls(raw: bytes, safe_bytes: bytes, check_gap: bool = False) -> bool:
+    """
+    字节级预检，返回 False 表示文件一定没有需要处理的调用，无需解码
+    check_gap 为 True 时函数名与括号之间有任何内容也算可疑 (修复会去掉其中的空白)
+    """
+    if b'addappid' not in raw and b'setManifestid' not in raw:
+        return False
+    for m in CALL_PATTERN_B.finditer(raw):
+        if (check_gap and m.group(1)) or m.group(2).translate(None, safe_bytes):
+            return True
+    return False
+
+
+def read_lua(file_path: str, safe_bytes: bytes, check_gap: bool = False):
+    """
+    读取文件，通过预检时按 utf-8 / gbk 解码并统一换行符 (与文本模式读取一致)
+    返回解码后的文本；无需处理、无法读取或无法解码时返回 None
+    """
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if not has_suspect_calls(raw, safe_bytes, check_gap):
+        return None
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            content = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        return None
+    return content.replace('\r\n', '\n').replace('\r', '\n')
+
 
 def check_file(file_path: str) -> tuple:
     """
@@ -31,39 +79,26 @@ def check_file(file_path: str) -> tuple:
     返回: (文件路径, 是否有问题, addappid问题列表, setManifestid问题列表)
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-        except:
-            return (file_path, False, [], [])
+        content = read_lua(file_path, CHECK_SAFE_BYTES)
     except:
         return (file_path, False, [], [])
+    if content is None:
+        return (file_path, False, [], [])
     
     addappid_issues = []
     setmanifest_issues = []
     
-    # 检查 addappid()
-    for match in ADDAPPID_PATTERN.findall(content):
-        if not ALLOWED_PATTERN.match(match):
-            illegal_chars = [c for c in match if c not in ALLOWED_CHARS]
-            if illegal_chars:
-                addappid_issues.append({
-                    'content': match[:50],
-                    'illegal_chars': list(set(illegal_chars))
-                })
-    
-    # 检查 setManifestid()
-    for match in SETMANIFEST_PATTERN.findall(content):
-        if not ALLOWED_PATTERN.match(match):
-            illegal_chars = [c for c in match if c not in ALLOWED_CHARS]
-            if illegal_chars:
-                setmanifest_issues.append({
-                    'content': match[:50],
-                    'illegal_chars': list(set(illegal_chars))
-                })
+    # 分别检查 addappid() 和 setManifestid()
+    for pattern, issues in ((ADDAPPID_PATTERN, addappid_issues), (SETMANIFEST_PATTERN, setmanifest_issues)):
+        for match in pattern.findall(content):
+            if not ALLOWED_PATTERN.match(match):
+                # 集合差在 C 层完成分类
+                illegal_chars = set(match).difference(ALLOWED_CHARS)
+                if illegal_chars:
+                    issues.append({
+                        'content': match[:50],
+                        'illegal_chars': list(illegal_chars)
+                    })
     
     has_issues = len(addappid_issues) > 0 or len(setmanifest_issues) > 0
     return (file_path, has_issues, addappid_issues, setmanifest_issues)
@@ -75,40 +110,29 @@ def fix_file(file_path: str) -> tuple:
     返回: (文件路径, 是否修改, 修复数量)
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-        except:
-            return (file_path, False, 0)
+        content = read_lua(file_path, FIX_SAFE_BYTES, check_gap=True)
     except:
         return (file_path, False, 0)
+    if content is None:
+        return (file_path, False, 0)
     
     original_content = content
     fix_count = 0
     
-    # 清理 addappid() 内容
-    def clean_addappid(match):
-        nonlocal fix_count
-        inner = match.group(1)
-        cleaned = ''.join(c for c in inner if c in ALLOWED_CHARS)
-        if inner != cleaned:
-            fix_count += 1
-        return f'addappid({cleaned})'
-    
-    # 清理 setManifestid() 内容
-    def clean_setmanifest(match):
-        nonlocal fix_count
-        inner = match.group(1)
-        cleaned = ''.join(c for c in inner if c in ALLOWED_CHARS)
-        if inner != cleaned:
-            fix_count += 1
-        return f'setManifestid({cleaned})'
-    
-    content = ADDAPPID_PATTERN.sub(clean_addappid, content)
-    content = SETMANIFEST_PATTERN.sub(clean_setmanifest, content)
+    # 清理 addappid() 和 setManifestid() 内容
+    def clean_func(func_name):
+        def clean(match):
+            nonlocal fix_count
+            inner = match.group(1)
+            cleaned = ILLEGAL_PATTERN.sub('', inner)
+            if inner != cleaned:
+                fix_count += 1
+            return f'{func_name}({cleaned})'
+        return clean
+    
+    # 两种函数依次替换 (合并正则会漏掉嵌套在另一函数参数中的调用)
+    content = ADDAPPID_PATTERN.sub(clean_func('addappid'), content)
+    content = SETMANIFEST_PATTERN.sub(clean_func('setManifestid'), content)
     
     if content != original_content:
         try:
@@ -133,11 +157,11 @@ def find_lua_files(directory: str, progress_callback=None) -> list:
             try:
                 with os.scandir(current) as it:
                     for entry in it:
-                        if entry.is_file():
-                            if entry.name.lower().endswith('.lua'):
-                                lua_files.append(entry.path)
-                        elif entry.is_dir():
-                            stack.append(entry.path)
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif entry.name.lower().endswith('.lua'):
+                            lua_files.append(entry.path)
                         count += 1
                         if count % 1000 == 0 and progress_callback:
                             progress_callback(f"已扫描 {count} 个对象...")
@@ -192,8 +216,7 @@ def run_check(target_dir: str, progress_callback=None) -> dict:
     addappid_count = 0
     setmanifest_count = 0
     
-    for i, file_path in enumerate(lua_files):
-        result = check_file(file_path)
+    for i, result in enumerate(map(check_file, lua_files)):
         if result[1]:  # 有问题
             problems.append((result[0], result[2], result[3]))
             addappid_count += len(result[2])
@@ -226,13 +249,15 @@ def run_check(target_dir: str, progress_callback=None) -> dict:
                 "message": f"检查完成，{len(lua_files)} 个文件均正常"}
 
 
-def run_fix(target_dir: str, progress_callback=None) -> dict:
+def run_fix(target_dir: str, progress_callback=None, candidate_files=None) -> dict:
     """
     修复所有有问题的文件
     
     Args:
         target_dir: 目标目录
         progress_callback: 进度回调函数 callback(message)
+        candidate_files: 待修复的文件列表 (通常为 run_check 结果中的问题文件)，
+            提供时不再重新扫描目录
         
     Returns:
         {
@@ -250,12 +275,13 @@ def run_fix(target_dir: str, progress_callback=None) -> dict:
     if not os.path.exists(target_dir):
         return {"success": False, "total": 0, "fixed": 0, "message": f"目录不存在: {target_dir}"}
     
-    log(f"开始扫描目录: {target_dir}")
-    
     # 查找所有 Lua 文件
-    if os.path.isfile(target_dir):
+    if candidate_files is not None:
+        lua_files = list(candidate_files)
+    elif os.path.isfile(target_dir):
         lua_files = [target_dir]
     else:
+        log(f"开始扫描目录: {target_dir}")
         lua_files = find_lua_files(target_dir, log)
     
     if not lua_files:
@@ -267,12 +293,11 @@ def run_fix(target_dir: str, progress_callback=None) -> dict:
     fixed_count = 0
     total_fixes = 0
     
-    for i, file_path in enumerate(lua_files):
-        result = fix_file(file_path)
+    for i, result in enumerate(map(fix_file, lua_files)):
         if result[1]:  # 有修改
             fixed_count += 1
             total_fixes += result[2]
-            log(f"  已修复: {os.path.basename(file_path)} ({result[2]} 处)")
+            log(f"  已修复: {os.path.basename(result[0])} ({result[2]} 处)")
         
         if (i + 1) % 500 == 0:
             log(f"已处理 {i + 1}/{len(lua_files)} 个文件...")
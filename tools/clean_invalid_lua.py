@@ -14,11 +14,85 @@
 import os
 import sys
 import re
+import mmap
 from pathlib import Path
+from typing import Optional
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 
 # 匹配 setManifestid(depot_id, "manifest_id") 的正则
-MANIFEST_PATTERN = re.compile(r'setManifestid\s*\(\s*(\d+)\s*,\s*["\'](\d+)["\']', re.IGNORECASE)
+MANIFEST_PATTERN = re.compile(rb'setManifestid\s*\(\s*(\d+)\s*,\s*["\'](\d+)["\']', re.IGNORECASE)
+
+# 文本路径使用的 str 版本 (\s、\d 按 Unicode 匹配)
+MANIFEST_TEXT_PATTERN = re.compile(r'setManifestid\s*\(\s*(\d+)\s*,\s*["\'](\d+)["\']', re.IGNORECASE)
+KEY_TEXT_PATTERN = re.compile(r'addappid\s*\(\s*\d+\s*,\s*\d+\s*,\s*["\']', re.IGNORECASE)
+
+# 匹配 addappid(depot_id 的正则
+DEPOT_ID_PATTERN = re.compile(rb'addappid\s*\(\s*(\d+)', re.IGNORECASE)
+
+# 先在前多少字节内判断有效性，远大于任何正常的解锁脚本
+# 前缀只能确认文件有效，前缀内判为无效时会再扫描完整内容
+LUA_MAX_SCAN_BYTES = 256 * 1024
+
+# 大于该大小的文件使用 mmap 扫描，小文件直接读取更省 (mmap 建立映射有固定开销)
+MMAP_THRESHOLD = 16 * 1024
+
+# 常见大小写的 Lua 后缀，命中时无需 lower()
+LUA_SUFFIXES = ('.lua', '.LUA', '.Lua')
+
+# 受保护的关键文件 (小写)
+KEEP_NAMES = {'steamtools.lua', 'greenluma_config.lua'}
+
+# 扫描时跳过的目录
+SKIP_DIRS = {'.git', '__pycache__', 'node_modules'}
+
+# 字节正则的 \s 只认 ASCII 空白，且不把单独的 \r 当作换行
+# 含非 ASCII 字节、\x1c-\x1f 或单独 \r 的文件解码后按文本规则判断，结果与按文本读取一致
+TEXT_PATH_RE = re.compile(rb'[\x1c-\x1f\x80-\xff]|\r(?!\n)')
+
+# 匹配任意一行非空且不是注释的代码行
+CODE_LINE_RE = re.compile(rb'^[^\S\n]*(?!--)\S', re.MULTILINE)
+
+# 一次扫描同时识别三类标记，按 lastgroup 分派:
+#   bad: 错误格式标记 (区分大小写)
+#   key: 带密钥的 addappid(id, flag, "key")，零宽断言锚定在非注释行首，不消耗内容
+#        ([^\S\n] 为不含换行的空白，保证只在同一行内匹配)
+#   add: 任意 addappid( (不区分大小写)
+SCAN_RE = re.compile(
+    rb'(?P<key>^(?=(?![^\S\n]*--)[^\n]*?(?i:addappid)[^\S\n]*\([^\S\n]*\d+[^\S\n]*,[^\S\n]*\d+[^\S\n]*,[^\S\n]*["\']))'
+    rb'|(?P<bad>UnlockApp|CSharpAPIWrapper)'
+    rb'|(?P<add>(?i:addappid)\()',
+    re.MULTILINE
+)
+
+
+def read_lua(file_path: str, limit: int = -1) -> Optional[bytes]:
+    """
+    以二进制读取 Lua 文件，limit 为最多读取的字节数，读取失败返回 None
+    判断所需的标记都是 ASCII，直接在 bytes 上匹配，无需解码
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(limit)
+    except:
+        return None
+
+
+def decode_lua(content) -> Optional[str]:
+    """按 UTF-8、GBK 的顺序解码 bytes 或 mmap，都失败时返回 None"""
+    data = bytes(content)
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def manifest_pairs(content: bytes) -> list:
+    """提取 setManifestid 的 (depot_id, manifest_id)，转为 str"""
+    return [(d.decode(), m.decode()) for d, m in MANIFEST_PATTERN.findall(content)]
 
 
 def get_manifest_ids_from_lua(file_path: str) -> list:
@@ -26,78 +100,150 @@ def get_manifest_ids_from_lua(file_path: str) -> list:
     从 Lua 文件中提取所有清单信息
     返回: [(depot_id, manifest_id), ...]
     """
+    info = scan_lua(file_path)
+    return list(info["manifests"]) if info else []  # [(depot_id, manifest_id), ...]
+
+
+def scan_lua(file_path: str) -> Optional[dict]:
+    """
+    读取一次 Lua 文件，同时得出有效性、原因、清单列表和 depot ID 集合
+    返回: {"invalid": bool, "reason": str, "manifests": [...], "depot_ids": frozenset}，读取失败返回 None
+    结果按 (路径, mtime_ns, 大小) 缓存，文件未变化时不再读取
+    """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return _scan_lua_cached(file_path, st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=8192)
+def _scan_lua_cached(file_path: str, mtime_ns: int, size: int) -> Optional[dict]:
+    """scan_lua 的缓存实现，mtime_ns 只参与缓存键"""
+    if size > MMAP_THRESHOLD:
+        # 大文件直接在映射的页缓存上做字节正则扫描，不复制到 Python bytes
         try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-        except:
-            return []
-    except:
-        return []
+            with open(file_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return lua_facts(mm)
+        except (OSError, ValueError):
+            return None
     
-    matches = MANIFEST_PATTERN.findall(content)
-    return matches  # [(depot_id, manifest_id), ...]
+    content = read_lua(file_path)
+    if content is None:
+        return None
+    return lua_facts(content)
 
 
-def is_invalid_lua(file_path: str) -> tuple:
+def lua_facts(content) -> dict:
     """
-    检查 Lua 文件是否无效
-    返回: (文件路径, 是否无效, 原因, [(depot_id, manifest_id), ...])
+    在 bytes 或 mmap 上得出 scan_lua 的全部结果
+    有效性先看前 LUA_MAX_SCAN_BYTES 字节，清单和 depot 从完整内容提取
     """
-    filename = os.path.basename(file_path)
+    manifests = None
+    if TEXT_PATH_RE.search(content):
+        text = decode_lua(content)
+        if text is None:
+            # 无法解码的文件与按文本读取时一样保留，不判断有效性
+            reason = "无法读取"
+        else:
+            reason = classify_text(text)
+            manifests = MANIFEST_TEXT_PATTERN.findall(text)
+    else:
+        reason = classify_lua(content)
+        # 前缀不足以判定无效 (如很长的开头注释)，扫描完整内容后再下结论
+        if reason is not None and len(content) > LUA_MAX_SCAN_BYTES:
+            reason = classify_lua(content, len(content))
+    if manifests is None:
+        manifests = manifest_pairs(content)
+    return {
+        "invalid": reason not in (None, "无法读取"),
+        "reason": reason or "有效文件",
+        "manifests": tuple(manifests),
+        "depot_ids": frozenset(d.decode() for d in DEPOT_ID_PATTERN.findall(content)),
+    }
+
+
+def classify_lua(content, endpos: int = LUA_MAX_SCAN_BYTES) -> Optional[str]:
+    """
+    按字节内容 (bytes 或 mmap) 判断 Lua 文件是否无效，返回无效原因，有效时返回 None
+    只扫描前 endpos 个字节，不复制切片
+    只做一次 CODE_LINE_RE 和一次 SCAN_RE 扫描，循环全部在正则引擎 (C 层) 内完成
+    """
+    if not CODE_LINE_RE.search(content, 0, endpos):
+        return "空文件"
     
-    # 保护关键文件
-    if filename.lower() in ['steamtools.lua', 'greenluma_config.lua']:
-        return (file_path, False, "系统关键文件", [])
+    found = set()
+    for m in SCAN_RE.finditer(content, 0, endpos):
+        if m.lastgroup == 'bad':
+            return "错误格式"
+        found.add(m.lastgroup)
     
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-        except:
-            return (file_path, False, "无法读取", [])
-    except:
-        return (file_path, False, "无法读取", [])
+    if 'add' not in found:
+        return "不含 addappid"
     
-    # 提取清单信息（无论是否有效都要提取）
-    manifest_ids = MANIFEST_PATTERN.findall(content)
+    # 检查是否有有效的密钥
+    if 'key' not in found:
+        return "无有效密钥"
     
-    lines = [l.strip() for l in content.split('\n') if l.strip() and not l.strip().startswith('--')]
+    return None
+
+
+def classify_text(content: str) -> Optional[str]:
+    """
+    按解码后的文本判断 Lua 文件是否无效，规则与 classify_lua 相同
+    用于含非 ASCII 字节等字节正则无法正确处理空白的文件
+    """
+    content = content.replace('\r\n', '\n').replace('\r', '\n')
+    lines = [l for l in (l.strip() for l in content.split('\n')) if l and not l.startswith('--')]
     
     if not lines:
-        return (file_path, True, "空文件", manifest_ids)
+        return "空文件"
     
     if 'UnlockApp' in content or 'CSharpAPIWrapper' in content:
-        return (file_path, True, "错误格式", manifest_ids)
+        return "错误格式"
     
-    has_any_addappid = 'addappid(' in content.lower()
-    if not has_any_addappid:
-        return (file_path, True, "不含 addappid", manifest_ids)
+    if 'addappid(' not in content.lower():
+        return "不含 addappid"
     
     # 检查是否有有效的密钥
-    has_key = False
-    for line in lines:
-        if re.search(r'addappid\s*\(\s*\d+\s*,\s*\d+\s*,\s*"', line, re.IGNORECASE):
-            has_key = True
-            break
-        if re.search(r'addappid\s*\(\s*\d+\s*,\s*\d+\s*,\s*\'', line, re.IGNORECASE):
-            has_key = True
-            break
+    if not any(KEY_TEXT_PATTERN.search(line) for line in lines):
+        return "无有效密钥"
     
-    if not has_key:
-        return (file_path, True, "无有效密钥", manifest_ids)
+    return None
+
+
+def is_invalid_lua(file_path: str, size: Optional[int] = None) -> tuple:
+    """
+    检查 Lua 文件是否无效
+    返回: (文件路径, 是否无效, 原因, [(depot_id, manifest_id), ...])
+    清单列表只在文件无效时返回，有效文件返回空列表
+    size 为扫描目录时已知的文件大小，为 0 时无需打开文件
+    """
+    filename = os.path.basename(file_path)
     
-    return (file_path, False, "有效文件", manifest_ids)
+    # 保护关键文件
+    if filename.lower() in KEEP_NAMES:
+        return (file_path, False, "系统关键文件", [])
+    
+    if size == 0:
+        return (file_path, True, "空文件", [])
+    
+    info = scan_lua(file_path)
+    if info is None:
+        return (file_path, False, "无法读取", [])
+    
+    # 清单信息只在文件无效时返回 (仅用于删除对应清单)
+    if not info["invalid"]:
+        return (file_path, False, info["reason"], [])
+    return (file_path, True, info["reason"], list(info["manifests"]))
 
 
 def find_lua_files(directory: str, progress_callback=None) -> list:
-    """快速查找所有 Lua 文件"""
+    """
+    快速查找所有 Lua 文件
+    返回: [(文件路径, 文件大小), ...]，大小取自目录项 (Windows 上无需额外 stat)，获取失败时为 None
+    """
     lua_files = []
     count = 0
     
@@ -108,11 +254,16 @@ def find_lua_files(directory: str, progress_callback=None) -> list:
             try:
                 with os.scandir(current) as it:
                     for entry in it:
-                        if entry.is_file():
-                            if entry.name.lower().endswith('.lua'):
-                                lua_files.append(entry.path)
-                        elif entry.is_dir():
-                            stack.append(entry.path)
+                        name = entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            if name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                        elif name.endswith(LUA_SUFFIXES) or name.lower().endswith('.lua'):
+                            try:
+                                size = entry.stat(follow_symlinks=False).st_size
+                            except OSError:
+                                size = None
+                            lua_files.append((entry.path, size))
                         count += 1
                         if count % 1000 == 0 and progress_callback:
                             progress_callback(f"已扫描 {count} 个对象...")
@@ -125,6 +276,15 @@ def find_lua_files(directory: str, progress_callback=None) -> list:
     return lua_files
 
 
+def safe_remove(path: str) -> bool:
+    """删除文件，返回是否成功"""
+    try:
+        os.remove(path)
+        return True
+    except:
+        return False
+
+
 def find_depotcache_dir(stplugin_dir: str) -> str:
     """
     根据 stplug-in 目录找到 depotcache 目录
@@ -178,7 +338,7 @@ def run_clean(target_dir: str, auto_delete: bool = False, progress_callback=None
     
     # 查找所有 Lua 文件
     if os.path.isfile(target_dir):
-        lua_files = [target_dir]
+        lua_files = [(target_dir, None)]
     else:
         lua_files = find_lua_files(target_dir, log)
     
@@ -188,16 +348,20 @@ def run_clean(target_dir: str, auto_delete: bool = False, progress_callback=None
     
     log(f"找到 {len(lua_files)} 个 Lua 文件，开始检查...")
     
-    # 逐个检查文件
+    # 线程池并发读取检查 (I/O 密集)，进度只在当前线程汇报
     invalid_files = []  # [(file_path, reason, manifest_ids), ...]
+    max_workers = min(32, (os.cpu_count() or 4) * 4)
     
-    for i, file_path in enumerate(lua_files):
-        result = is_invalid_lua(file_path)
-        if result[1]:  # 无效
-            invalid_files.append((result[0], result[2], result[3]))  # (path, reason, manifest_ids)
-        
-        if (i + 1) % 500 == 0:
-            log(f"已检查 {i + 1}/{len(lua_files)} 个文件...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = [fp for fp, _ in lua_files]
+        sizes = [size for _, size in lua_files]
+        results = executor.map(is_invalid_lua, paths, sizes)
+        for i, result in enumerate(results):
+            if result[1]:  # 无效
+                invalid_files.append((result[0], result[2], result[3]))  # (path, reason, manifest_ids)
+            
+            if (i + 1) % 500 == 0:
+                log(f"已检查 {i + 1}/{len(lua_files)} 个文件...")
     
     if not invalid_files:
         return {"success": True, "total": len(lua_files), "invalid": [], "deleted": 0, 
@@ -219,27 +383,38 @@ def run_clean(target_dir: str, auto_delete: bool = False, progress_callback=None
     manifests_deleted = 0
     
     if auto_delete:
+        # 逐个删除是串行的系统调用，交给线程池并发执行，计数在当前线程完成
         log(f"正在删除 {len(invalid_files)} 个无效文件...")
         
-        for fp, _, manifest_ids in invalid_files:
-            # 删除 Lua 文件
+        # 一次列举清单目录，之后用集合判断是否存在，避免逐个 stat
+        existing = set()
+        if depotcache_dir:
             try:
-                os.remove(fp)
+                with os.scandir(depotcache_dir) as it:
+                    existing = {entry.name for entry in it}
+            except OSError:
+                pass
+        
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            # 删除 Lua 文件
+            lua_paths = [fp for fp, _, _ in invalid_files]
+            manifest_paths = []
+            for (fp, _, manifest_ids), ok in zip(invalid_files, executor.map(safe_remove, lua_paths)):
+                if not ok:
+                    log(f"删除失败: {os.path.basename(fp)}")
+                    continue
                 deleted += 1
-            except Exception as e:
-                log(f"删除失败: {os.path.basename(fp)}")
-                continue
+                
+                # 只删除 Lua 已成功删除的对应清单文件
+                if depotcache_dir and manifest_ids:
+                    for depot_id, manifest_id in manifest_ids:
+                        name = f"{depot_id}_{manifest_id}.manifest"
+                        if name in existing:
+                            existing.discard(name)
+                            manifest_paths.append(os.path.join(depotcache_dir, name))
             
             # 删除对应的清单文件
-            if depotcache_dir and manifest_ids:
-                for depot_id, manifest_id in manifest_ids:
-                    manifest_file = os.path.join(depotcache_dir, f"{depot_id}_{manifest_id}.manifest")
-                    if os.path.exists(manifest_file):
-                        try:
-                            os.remove(manifest_file)
-                            manifests_deleted += 1
-                        except:
-                            pass
+            manifests_deleted = sum(executor.map(safe_remove, manifest_paths))
         
         log(f"已删除 {deleted} 个 Lua 文件，{manifests_deleted} 个清单文件")
     else:
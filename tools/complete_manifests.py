@@ -9,17 +9,20 @@
 直接调用:
     from tools.complete_manifests import run_complete_single, run_complete_all
     result = run_complete_single(app_id, lua_dir, depot_cache, progress_callback)
-    result = run_complete_all(lua_dir, depot_cache, progress_callback)
+    result = run_complete_all(lua_dir, depot_cache, progress_callback, token=github_token)
 """
 import os
-import re
-import time
 import json
-import urllib.request
-import urllib.error
+import asyncio
+import aiohttp
 from typing import List, Set, Dict, Tuple, Any, Optional, Callable
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from clean_invalid_lua import scan_lua
+from downloader import (
+    create_session, get_branch_listings_graphql, json_loads, GitHubRateLimiter, GRAPHQL_BATCH_SIZE,
+    open_part_file, commit_part_file, discard_part_file
+)
 
 
 # GitHub 仓库配置
@@ -27,10 +30,22 @@ REPO_PATH = "SteamAutoCracks/ManifestHub"
 RAW_BASE_URL = f"https://raw.githubusercontent.com/{REPO_PATH}"
 API_BASE_URL = f"https://api.github.com/repos/{REPO_PATH}"
 
+# 分支文件列表的 ETag 缓存: {app_id: {"etag": str, "manifests": [[depot_id, url, filename], ...]}}
+# 带 If-None-Match 请求时未变化的分支返回 304，不消耗 API 配额
+ETAG_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "steam_unlocker", "etags.json")
+
+# 流式下载时每次读取/写入的块大小
+CHUNK_SIZE = 64 * 1024
+
+# 批量补全时的并发限制 (API 配额由 GitHubRateLimiter 按响应头控制)
+API_CONCURRENCY = 20
+DOWNLOAD_CONCURRENCY = 50
+
 
 def get_depot_ids_from_lua(lua_path: str) -> Set[str]:
     """
     从 Lua 文件提取所有 addappid 的 depot ID
+    与清理工具共用 scan_lua 的单次读取结果 (按文件 mtime/大小缓存)
     
     Args:
         lua_path: Lua 文件路径
@@ -38,17 +53,11 @@ def get_depot_ids_from_lua(lua_path: str) -> Set[str]:
     Returns:
         depot ID 集合
     """
-    depot_ids = set()
-    pattern = re.compile(r'addappid\s*\(\s*(\d+)', re.IGNORECASE)
-    
-    try:
-        content = Path(lua_path).read_text(encoding='utf-8', errors='ignore')
-        matches = pattern.findall(content)
-        depot_ids = set(matches)
-    except Exception as e:
-        print(f"读取 Lua 文件失败: {e}")
-    
-    return depot_ids
+    info = scan_lua(lua_path)
+    if info is None:
+        print(f"读取 Lua 文件失败: {lua_path}")
+        return set()
+    return set(info["depot_ids"])
 
 
 def get_existing_manifest_files(depot_cache: str) -> Set[str]:
@@ -74,72 +83,199 @@ def get_existing_manifest_files(depot_cache: str) -> Set[str]:
     return existing
 
 
-def get_manifests_from_github(app_id: str, retry: int = 3) -> List[Tuple[str, str]]:
-    """
-    从 GitHub 分支获取所有 manifest 文件列表
-    
-    Args:
-        app_id: 游戏 App ID (也是分支名)
-        retry: 重试次数
+def load_etag_cache() -> Dict[str, Dict[str, Any]]:
+    """加载分支文件列表的 ETag 缓存，不存在或损坏时返回空字典"""
+    try:
+        with open(ETAG_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except:
+        return {}
+
+
+def save_etag_cache(cache: Dict[str, Dict[str, Any]]) -> None:
+    """保存分支文件列表的 ETag 缓存"""
+    try:
+        os.makedirs(os.path.dirname(ETAG_CACHE_FILE), exist_ok=True)
+        with open(ETAG_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"保存 ETag 缓存失败: {e}")
+
+
+def listing_headers(app_id: str, etag_cache: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, str]:
+    """分支文件列表请求头，有缓存时附带 If-None-Match"""
+    headers = {"User-Agent": "SteamUnlocker/2.3", "Accept": "application/vnd.github.v3+json"}
+    cached = etag_cache.get(app_id) if etag_cache is not None else None
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    return headers
+
+
+def remember_listing(
+    app_id: str,
+    etag: Optional[str],
+    manifests: List[Tuple[str, str, str]],
+    etag_cache: Optional[Dict[str, Dict[str, Any]]]
+) -> None:
+    """记录 200 响应的 ETag 和解析后的 manifest 列表"""
+    if etag_cache is not None and etag:
+        etag_cache[app_id] = {"etag": etag, "manifests": [list(m) for m in manifests]}
+
+
+def cached_listing(app_id: str, etag_cache: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str, str]]:
+    """304 时返回缓存的 manifest 列表"""
+    return [tuple(m) for m in etag_cache[app_id]["manifests"]]
+
+
+def parse_manifest_listing(app_id: str, files_info: list) -> List[Tuple[str, str, str]]:
+    """从分支文件列表中筛选 manifest，返回 [(depot_id, download_url, filename), ...]"""
+    manifests = []
+    for file_info in files_info:
+        if not isinstance(file_info, dict):
+            continue
         
-    Returns:
-        [(depot_id, download_url), ...] 列表
+        filename = file_info.get("name", "")
+        if filename.endswith(".manifest"):
+            # 提取 depot_id (格式: {depot_id}_{gid}.manifest)
+            parts = filename[:-9].split("_")  # 去掉 .manifest
+            if parts and parts[0].isdigit():
+                depot_id = parts[0]
+                download_url = file_info.get("download_url") or f"{RAW_BASE_URL}/{app_id}/{filename}"
+                manifests.append((depot_id, download_url, filename))
+    return manifests
+
+
+async def get_manifests_from_github_async(
+    session: aiohttp.ClientSession,
+    app_id: str,
+    retry: int = 3,
+    etag_cache: Optional[Dict[str, Dict[str, Any]]] = None,
+    rate_limiter: Optional[GitHubRateLimiter] = None
+) -> List[Tuple[str, str, str]]:
+    """
+    获取分支中的所有 manifest 文件列表，复用调用方的会话
+    提供 rate_limiter 时按响应头的剩余配额决定是否等待
     """
-    manifests = []
     api_url = f"{API_BASE_URL}/contents?ref={app_id}"
-    headers = {"User-Agent": "SteamUnlocker/2.3", "Accept": "application/vnd.github.v3+json"}
+    headers = listing_headers(app_id, etag_cache)
     
     for attempt in range(retry):
         try:
-            req = urllib.request.Request(api_url, headers=headers)
-            with urllib.request.urlopen(req, timeout=30) as response:
-                files_info = json.loads(response.read().decode('utf-8'))
-                
-                for file_info in files_info:
-                    if not isinstance(file_info, dict):
-                        continue
-                    
-                    filename = file_info.get("name", "")
-                    if filename.endswith(".manifest"):
-                        # 提取 depot_id (格式: {depot_id}_{gid}.manifest)
-                        parts = filename[:-9].split("_")  # 去掉 .manifest
-                        if parts and parts[0].isdigit():
-                            depot_id = parts[0]
-                            download_url = file_info.get("download_url") or f"{RAW_BASE_URL}/{app_id}/{filename}"
-                            manifests.append((depot_id, download_url, filename))
+            if rate_limiter:
+                await rate_limiter.acquire()
+            async with session.get(api_url, headers=headers) as response:
+                if rate_limiter:
+                    rate_limiter.update(response.headers)
+                if response.status == 304:
+                    return cached_listing(app_id, etag_cache)  # 分支未变化
+                if response.status == 404:
+                    return []  # 分支不存在
+                if response.status == 403:
+                    # API 限速 (配额耗尽时下一次 acquire 会等待重置)
+                    if attempt < retry - 1:
+                        await asyncio.sleep(2)
+                    continue
+                if response.status != 200:
+                    if attempt < retry - 1:
+                        await asyncio.sleep(1)
+                    continue
                 
+                files_info = json_loads(await response.read())
+                manifests = parse_manifest_listing(app_id, files_info)
+                remember_listing(app_id, response.headers.get("ETag"), manifests, etag_cache)
                 return manifests
-                
-        except urllib.error.HTTPError as e:
-            if e.code == 404:
-                return []  # 分支不存在
-            elif e.code == 403:
-                # API 限速
-                if attempt < retry - 1:
-                    time.sleep(2)
-                continue
-        except Exception as e:
+        except Exception:
             if attempt < retry - 1:
-                time.sleep(1)
+                await asyncio.sleep(1)
             continue
     
-    return manifests
+    return []
 
 
-def download_manifest(url: str, dest_path: str, filename: str) -> Tuple[bool, str, int]:
+async def download_manifest_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    dest_path: str,
+    filename: str
+) -> Tuple[bool, str, Any]:
     """下载单个 manifest 文件"""
     try:
         headers = {"User-Agent": "SteamUnlocker/2.3"}
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=60) as response:
-            content = response.read()
-            with open(dest_path, 'wb') as f:
-                f.write(content)
-            return (True, filename, len(content))
+        async with session.get(url, headers=headers) as response:
+            if response.status != 200:
+                return (False, filename, f"HTTP {response.status}")
+            f, part_path = open_part_file(dest_path)
+            try:
+                with f:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        f.write(chunk)
+                    size = f.tell()
+                commit_part_file(part_path, dest_path)
+            except BaseException:
+                discard_part_file(part_path)
+                raise
+            return (True, filename, size)
     except Exception as e:
         return (False, filename, str(e))
 
 
+async def complete_single_async(
+    session: aiohttp.ClientSession,
+    app_id: str,
+    lua_path: str,
+    depot_cache: str,
+    existing_files: Set[str],
+    api_sem: asyncio.Semaphore,
+    download_sem: asyncio.Semaphore,
+    listings: Optional[Dict[str, Optional[list]]] = None,
+    etag_cache: Optional[Dict[str, Dict[str, Any]]] = None,
+    rate_limiter: Optional[GitHubRateLimiter] = None
+) -> Dict[str, Any]:
+    """
+    补全单个游戏的清单 (批量模式使用，共享会话与已存在文件集合)
+    listings 中已有该分支的文件列表 (GraphQL 批量获取) 时不再请求 REST 接口
+    """
+    depot_ids = get_depot_ids_from_lua(lua_path)
+    if not depot_ids:
+        return {"app_id": app_id, "downloaded": 0, "skipped": 0, "failed": []}
+    
+    if listings and app_id in listings:
+        github_manifests = parse_manifest_listing(app_id, listings[app_id] or [])
+    else:
+        async with api_sem:
+            github_manifests = await get_manifests_from_github_async(
+                session, app_id, etag_cache=etag_cache, rate_limiter=rate_limiter
+            )
+    
+    to_download = []
+    for depot_id, url, filename in github_manifests:
+        if depot_id in depot_ids and filename not in existing_files:
+            to_download.append((url, os.path.join(depot_cache, filename), filename))
+    
+    async def download_one(url, dest, name):
+        async with download_sem:
+            return await download_manifest_async(session, url, dest, name)
+    
+    results = await asyncio.gather(*[download_one(*t) for t in to_download])
+    
+    downloaded = 0
+    failed = []
+    for success, filename, info in results:
+        if success:
+            downloaded += 1
+            existing_files.add(filename)
+        else:
+            failed.append(f"{filename} - {info}")
+    
+    return {
+        "app_id": app_id,
+        "downloaded": downloaded,
+        "skipped": len(github_manifests) - len(to_download),
+        "failed": failed,
+    }
+
+
 def run_complete_single(
     app_id: str,
     lua_dir: str,
@@ -158,6 +294,16 @@ def run_complete_single(
     Returns:
         {"success": bool, "downloaded": int, "skipped": int, "message": str}
     """
+    return asyncio.run(run_complete_single_async(app_id, lua_dir, depot_cache, progress_callback))
+
+
+async def run_complete_single_async(
+    app_id: str,
+    lua_dir: str,
+    depot_cache: str,
+    progress_callback: Optional[Callable] = None
+) -> Dict[str, Any]:
+    """run_complete_single 的异步实现：列表请求和所有下载共用一个会话"""
     def log(msg):
         if progress_callback:
             progress_callback(msg)
@@ -179,47 +325,50 @@ def run_complete_single(
     
     log(f"找到 {len(depot_ids)} 个 depot，正在获取 GitHub 清单列表...")
     
-    # 获取 GitHub 上的 manifest 文件
-    github_manifests = get_manifests_from_github(app_id)
-    
-    if not github_manifests:
-        return {"success": True, "downloaded": 0, "skipped": 0,
-                "message": f"GitHub 分支 {app_id} 没有 manifest 文件或不存在"}
-    
-    log(f"GitHub 分支有 {len(github_manifests)} 个 manifest 文件")
-    
-    # 获取本地已有的 manifest 文件名
-    existing_files = get_existing_manifest_files(depot_cache)
-    
-    # 筛选需要下载的 manifest:
-    # 1. depot ID 在 Lua 中存在
-    # 2. 该 manifest 文件本地不存在 (通过完整文件名判断)
-    to_download = []
-    for depot_id, url, filename in github_manifests:
-        if depot_id in depot_ids and filename not in existing_files:
-            to_download.append((url, os.path.join(depot_cache, filename), filename))
-    
-    skipped = len(github_manifests) - len(to_download)
-    
-    if not to_download:
-        return {"success": True, "downloaded": 0, "skipped": skipped,
-                "message": f"所有 manifest 已存在，无需下载"}
-    
-    log(f"需要下载 {len(to_download)} 个 manifest...")
-    
-    # 确保目录存在
-    os.makedirs(depot_cache, exist_ok=True)
-    
-    # 并发下载
-    downloaded = 0
-    max_workers = min(10, len(to_download))
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(download_manifest, url, dest, name) 
-                   for url, dest, name in to_download]
+    async with create_session() as session:
+        # 获取 GitHub 上的 manifest 文件 (分支未变化时使用 ETag 缓存)
+        etag_cache = load_etag_cache()
+        github_manifests = await get_manifests_from_github_async(session, app_id, etag_cache=etag_cache)
+        save_etag_cache(etag_cache)
+        
+        if not github_manifests:
+            return {"success": True, "downloaded": 0, "skipped": 0,
+                    "message": f"GitHub 分支 {app_id} 没有 manifest 文件或不存在"}
+        
+        log(f"GitHub 分支有 {len(github_manifests)} 个 manifest 文件")
+        
+        # 获取本地已有的 manifest 文件名
+        existing_files = get_existing_manifest_files(depot_cache)
+        
+        # 筛选需要下载的 manifest:
+        # 1. depot ID 在 Lua 中存在
+        # 2. 该 manifest 文件本地不存在 (通过完整文件名判断)
+        to_download = []
+        for depot_id, url, filename in github_manifests:
+            if depot_id in depot_ids and filename not in existing_files:
+                to_download.append((url, os.path.join(depot_cache, filename), filename))
+        
+        skipped = len(github_manifests) - len(to_download)
+        
+        if not to_download:
+            return {"success": True, "downloaded": 0, "skipped": skipped,
+                    "message": f"所有 manifest 已存在，无需下载"}
         
-        for future in as_completed(futures):
-            success, filename, info = future.result()
+        log(f"需要下载 {len(to_download)} 个 manifest...")
+        
+        # 确保目录存在
+        os.makedirs(depot_cache, exist_ok=True)
+        
+        # 并发下载
+        downloaded = 0
+        download_sem = asyncio.Semaphore(10)
+        
+        async def download_one(url, dest, name):
+            async with download_sem:
+                return await download_manifest_async(session, url, dest, name)
+        
+        for next_done in asyncio.as_completed([download_one(*t) for t in to_download]):
+            success, filename, info = await next_done
             if success:
                 downloaded += 1
                 log(f"已下载: {filename}")
@@ -237,7 +386,8 @@ def run_complete_single(
 def run_complete_all(
     lua_dir: str,
     depot_cache: str,
-    progress_callback: Optional[Callable] = None
+    progress_callback: Optional[Callable] = None,
+    token: str = ""
 ) -> Dict[str, Any]:
     """
     批量补全所有游戏的清单
@@ -246,10 +396,21 @@ def run_complete_all(
         lua_dir: Lua 文件所在目录 (stplug-in)
         depot_cache: depotcache 目录路径
         progress_callback: 进度回调函数
+        token: GitHub Token，提供时通过 GraphQL 批量获取分支文件列表
         
     Returns:
         {"success": bool, "total_games": int, "total_downloaded": int, "message": str}
     """
+    return asyncio.run(run_complete_all_async(lua_dir, depot_cache, progress_callback, token))
+
+
+async def run_complete_all_async(
+    lua_dir: str,
+    depot_cache: str,
+    progress_callback: Optional[Callable] = None,
+    token: str = ""
+) -> Dict[str, Any]:
+    """run_complete_all 的异步实现：所有游戏共享一个会话并发处理"""
     def log(msg):
         if progress_callback:
             progress_callback(msg)
@@ -269,31 +430,63 @@ def run_complete_all(
     
     log(f"找到 {len(lua_files)} 个已解锁的游戏，开始补全清单...")
     
+    os.makedirs(depot_cache, exist_ok=True)
+    existing_files = get_existing_manifest_files(depot_cache)
+    
     total_downloaded = 0
     processed = 0
     errors = []
     
-    for i, lua_file in enumerate(lua_files):
-        app_id = lua_file.stem
-        
-        try:
-            log(f"[{i+1}/{len(lua_files)}] 正在处理 {app_id}...")
-            
-            result = run_complete_single(app_id, lua_dir, depot_cache)
-            
-            if result["downloaded"] > 0:
-                total_downloaded += result["downloaded"]
-                log(f"  → 下载 {result['downloaded']} 个 manifest")
+    api_sem = asyncio.Semaphore(API_CONCURRENCY)
+    download_sem = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+    etag_cache = load_etag_cache()
+    rate_limiter = GitHubRateLimiter()
+    
+    async with create_session() as session:
+        # 有 Token 时每 GRAPHQL_BATCH_SIZE 个分支只需一次 API 请求
+        listings = {}
+        if token:
+            app_ids = [f.stem for f in lua_files]
             
-            processed += 1
+            async def fetch(batch):
+                async with api_sem:
+                    return await get_branch_listings_graphql(session, REPO_PATH, batch, token)
             
-            # 避免 API 限速
-            if i < len(lua_files) - 1:
-                time.sleep(0.5)
+            for part in await asyncio.gather(*[
+                fetch(app_ids[i:i + GRAPHQL_BATCH_SIZE])
+                for i in range(0, len(app_ids), GRAPHQL_BATCH_SIZE)
+            ]):
+                listings.update(part)
+        
+        tasks = {
+            asyncio.ensure_future(complete_single_async(
+                session, f.stem, str(f), depot_cache, existing_files, api_sem, download_sem,
+                listings, etag_cache, rate_limiter
+            )): f.stem
+            for f in lua_files
+        }
+        
+        pending = set(tasks)
+        i = 0
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i += 1
+                app_id = tasks[task]
+                try:
+                    result = task.result()
+                except Exception as e:
+                    errors.append(f"{app_id}: {e}")
+                    continue
                 
-        except Exception as e:
-            errors.append(f"{app_id}: {e}")
-            continue
+                processed += 1
+                for failure in result["failed"]:
+                    log(f"  {app_id} 下载失败: {failure}")
+                if result["downloaded"] > 0:
+                    total_downloaded += result["downloaded"]
+                    log(f"[{i}/{len(lua_files)}] {app_id} → 下载 {result['downloaded']} 个 manifest")
+    
+    save_etag_cache(etag_cache)
     
     message = f"处理完成！共 {processed} 个游戏，下载 {total_downloaded} 个 manifest"
     if errors:
@@ -4,6 +4,7 @@ Steam Unlocker - 高并发下载器 (Python版)
 
 特性:
 - GitHub API 获取分支文件列表 (消耗 API 配额)
+- 有 Token 时通过 GraphQL 一次请求获取多个分支的文件列表
 - raw.githubusercontent.com 下载文件 (不消耗配额)
 - asyncio 高并发下载
 - 内置速率限制，安全使用 API 配额
@@ -19,12 +20,32 @@ import json
 import os
 import sys
 import time
+import uuid
 import argparse
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, AsyncIterator
 from dataclasses import dataclass, field
 from asyncio import Semaphore
 
+# 优先使用 orjson 解析 API 响应 (直接接受 bytes)，未安装时回退到标准库
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+
+# GraphQL 接口 (必须认证)，每个请求最多查询的分支数
+GRAPHQL_URL = "https://api.github.com/graphql"
+GRAPHQL_BATCH_SIZE = 50
+
+# 流式下载时每次读取/写入的块大小
+CHUNK_SIZE = 64 * 1024
+
+# 已下载文件的 ETag 记录: {目标文件绝对路径: {"etag": ..., "size": ..., "mtime_ns": ...}}
+# 再次下载时用于条件请求；与其他缓存一样放在用户缓存目录，不写入 Steam 目录
+FILE_ETAG_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "steam_unlocker", "file_etags.json")
+
 
 @dataclass
 class DownloadResult:
@@ -44,6 +65,186 @@ class BatchResult:
     total_time: float = 0.0
 
 
+def open_part_file(dest_path):
+    """
+    在目标文件同目录下创建唯一的临时文件用于下载，返回 (文件对象, 临时路径)
+    下载完成后用 commit_part_file 替换到目标路径，避免中断时留下不完整的目标文件
+    """
+    directory, name = os.path.split(os.path.abspath(dest_path))
+    part_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.part")
+    return open(part_path, 'xb'), part_path
+
+
+def commit_part_file(part_path: str, dest_path) -> None:
+    """下载完成后将临时文件原子地替换到目标路径"""
+    os.replace(part_path, dest_path)
+
+
+def discard_part_file(part_path: str) -> None:
+    """下载失败时删除临时文件"""
+    try:
+        os.remove(part_path)
+    except OSError:
+        pass
+
+
+def load_file_etags() -> Dict[str, Dict]:
+    """加载已下载文件的 ETag 记录，不存在或损坏时返回空字典"""
+    try:
+        with open(FILE_ETAG_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except:
+        return {}
+
+
+def save_file_etags(cache: Dict[str, Dict]) -> None:
+    """保存已下载文件的 ETag 记录"""
+    try:
+        os.makedirs(os.path.dirname(FILE_ETAG_CACHE_FILE), exist_ok=True)
+        with open(FILE_ETAG_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"保存 ETag 缓存失败: {e}")
+
+
+def read_etag(cache: Dict[str, Dict], dest_path: Path) -> Optional[str]:
+    """
+    读取下载文件记录的 ETag
+    本地文件不存在或大小 / mtime 与记录不符 (已被修改) 时返回 None，避免 304 保留被改动过的文件
+    """
+    entry = cache.get(os.path.abspath(dest_path))
+    if not entry:
+        return None
+    try:
+        st = dest_path.stat()
+    except OSError:
+        return None
+    if entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+        return None
+    return entry.get("etag")
+
+
+def write_etag(cache: Dict[str, Dict], dest_path: Path, etag: Optional[str]) -> None:
+    """下载完成后记录 ETag 与本地文件的大小和 mtime，响应没有 ETag 时删除旧记录"""
+    key = os.path.abspath(dest_path)
+    try:
+        if not etag:
+            cache.pop(key, None)
+            return
+        st = dest_path.stat()
+        cache[key] = {"etag": etag, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    except OSError:
+        cache.pop(key, None)
+
+
+class GitHubRateLimiter:
+    """
+    根据 REST 响应头的剩余配额控制请求节奏
+    配额充足时不等待；剩余低于阈值时等到配额重置 (最多等待 max_wait 秒)
+    """
+    
+    def __init__(self, threshold: int = 5, max_wait: float = 60.0):
+        self.threshold = threshold
+        self.max_wait = max_wait
+        self.remaining: Optional[int] = None  # 未收到响应前未知，不限制
+        self.reset_at = 0.0
+    
+    async def acquire(self) -> None:
+        """发起 API 请求前调用"""
+        if self.remaining is not None:
+            if self.remaining < self.threshold:
+                delay = self.reset_at - time.time()
+                if delay > 0:
+                    await asyncio.sleep(min(delay, self.max_wait))
+                self.remaining = None  # 等待后以下一个响应为准
+                return
+            # 计入已发出但尚未返回的请求
+            self.remaining -= 1
+    
+    def update(self, headers) -> None:
+        """根据响应头 X-RateLimit-Remaining / X-RateLimit-Reset 更新配额"""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        try:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if reset is not None:
+                self.reset_at = float(reset)
+        except ValueError:
+            pass
+
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    创建所有 GitHub 请求共用的 HTTP 会话 (需在事件循环中调用)
+    连接池保持长连接并缓存 DNS，同一批次内的请求不再重复握手
+    """
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=50,
+        ttl_dns_cache=300,
+        keepalive_timeout=60
+    )
+    timeout = aiohttp.ClientTimeout(total=60)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def get_branch_listings_graphql(
+    session: aiohttp.ClientSession,
+    repo: str,
+    branches: List[str],
+    token: str
+) -> Dict[str, Optional[List[Dict]]]:
+    """
+    通过 GraphQL 一次请求获取多个分支根目录的文件列表
+    
+    Returns:
+        {分支名: [{"name": ..., "type": "file"|"dir"}, ...]}，分支不存在时值为 None
+        请求失败时不包含对应分支，调用方应回退到 REST 接口
+    """
+    if not token or not branches:
+        return {}
+    
+    owner, _, name = repo.partition("/")
+    aliases = "\n".join(
+        f'b{i}: ref(qualifiedName: {json.dumps("refs/heads/" + branch)}) '
+        f'{{ target {{ ... on Commit {{ tree {{ entries {{ name type }} }} }} }} }}'
+        for i, branch in enumerate(branches)
+    )
+    query = f"query {{ repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{\n{aliases}\n}} }}"
+    
+    headers = {
+        "User-Agent": "SteamUnlocker/2.0",
+        "Authorization": f"Bearer {token}"
+    }
+    
+    try:
+        async with session.post(GRAPHQL_URL, json={"query": query}, headers=headers) as response:
+            if response.status != 200:
+                return {}
+            data = json_loads(await response.read())
+    except Exception:
+        return {}
+    
+    repository = (data.get("data") or {}).get("repository")
+    if not repository:
+        return {}
+    
+    listings = {}
+    for i, branch in enumerate(branches):
+        ref = repository.get(f"b{i}")
+        if ref is None:
+            listings[branch] = None  # 分支不存在
+            continue
+        entries = ((ref.get("target") or {}).get("tree") or {}).get("entries") or []
+        listings[branch] = [
+            {"name": e.get("name", ""), "type": "file" if e.get("type") == "blob" else "dir"}
+            for e in entries
+        ]
+    return listings
+
+
 class BatchDownloader:
     """高并发批量下载器"""
     
@@ -63,6 +264,8 @@ class BatchDownloader:
         self.api_concurrency = api_concurrency
         self.download_concurrency = download_concurrency
         self.api_remaining = 5000
+        self.rate_limiter = GitHubRateLimiter()
+        self.file_etags: Dict[str, Dict] = {}
         
         # 创建目录
         if self.lua_dir:
@@ -75,50 +278,85 @@ class BatchDownloader:
         start_time = time.time()
         result = BatchResult()
         
+        async for r in self.iter_batch(app_ids):
+            result.results.append(r)
+        
+        result.api_remaining = self.api_remaining
+        result.total_time = time.time() - start_time
+        return result
+    
+    async def iter_batch(self, app_ids: List[str]) -> AsyncIterator[DownloadResult]:
+        """批量下载多个游戏，按完成顺序逐个产出结果，调用方无需等待整批结束"""
         # 创建信号量限制并发
         api_sem = Semaphore(self.api_concurrency)
         download_sem = Semaphore(self.download_concurrency)
         
-        # 创建 HTTP 会话
-        connector = aiohttp.TCPConnector(limit=100, limit_per_host=50)
-        timeout = aiohttp.ClientTimeout(total=60)
+        # 加载已下载文件的 ETag 记录，整批结束后保存
+        self.file_etags = load_file_etags()
         
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        # 创建 HTTP 会话
+        async with create_session() as session:
+            # 有 Token 时先批量获取所有分支的文件列表，失败的分支回退到逐个 REST 请求
+            listings = await self._prefetch_listings(session, app_ids, api_sem)
+            
             # 并发处理所有游戏
             tasks = [
-                self._process_app(session, app_id, api_sem, download_sem)
+                asyncio.ensure_future(self._process_app(session, app_id, api_sem, download_sem, listings))
                 for app_id in app_ids
             ]
             
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            for r in results:
-                if isinstance(r, Exception):
-                    result.results.append(DownloadResult(
-                        app_id="unknown",
-                        error=str(r)
-                    ))
-                else:
-                    result.results.append(r)
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        yield await next_done
+                    except Exception as e:
+                        yield DownloadResult(app_id="unknown", error=str(e))
+            finally:
+                # 调用方提前退出时取消剩余任务
+                for task in tasks:
+                    task.cancel()
+                save_file_etags(self.file_etags)
+    
+    async def _prefetch_listings(
+        self,
+        session: aiohttp.ClientSession,
+        app_ids: List[str],
+        api_sem: Semaphore
+    ) -> Dict[str, Optional[List[Dict]]]:
+        """按 GRAPHQL_BATCH_SIZE 分批并发获取分支文件列表，无 Token 时返回空字典"""
+        if not self.token:
+            return {}
         
-        result.api_remaining = self.api_remaining
-        result.total_time = time.time() - start_time
-        return result
+        async def fetch(batch: List[str]) -> Dict[str, Optional[List[Dict]]]:
+            async with api_sem:
+                return await get_branch_listings_graphql(session, self.repo, batch, self.token)
+        
+        listings = {}
+        for part in await asyncio.gather(*[
+            fetch(app_ids[i:i + GRAPHQL_BATCH_SIZE])
+            for i in range(0, len(app_ids), GRAPHQL_BATCH_SIZE)
+        ]):
+            listings.update(part)
+        return listings
     
     async def _process_app(
         self,
         session: aiohttp.ClientSession,
         app_id: str,
         api_sem: Semaphore,
-        download_sem: Semaphore
+        download_sem: Semaphore,
+        listings: Optional[Dict[str, Optional[List[Dict]]]] = None
     ) -> DownloadResult:
-        """处理单个游戏"""
+        """处理单个游戏，listings 中已有该分支的文件列表时不再请求 API"""
         result = DownloadResult(app_id=app_id)
         
         try:
-            # 获取 API 信号量
-            async with api_sem:
-                files = await self._get_files_from_api(session, app_id)
+            if listings and app_id in listings:
+                files = listings[app_id]
+            else:
+                # 获取 API 信号量
+                async with api_sem:
+                    files = await self._get_files_from_api(session, app_id)
             
             if not files:
                 result.error = "无法获取文件列表"
@@ -142,28 +380,20 @@ class BatchDownloader:
                     dest_path = self.manifest_dir / filename
                     download_tasks.append((download_url, dest_path, False))
             
-            # 并发下载所有文件
-            lua_count = 0
-            manifest_count = 0
+            # 固定数量的工作协程从队列取任务下载，不为每个文件创建协程
+            queue: asyncio.Queue = asyncio.Queue()
+            for task in download_tasks:
+                queue.put_nowait(task)
             
-            async def download_one(url: str, path: Path, is_lua: bool) -> Tuple[bool, bool]:
-                async with download_sem:
-                    success = await self._download_file(session, url, path)
-                    return success, is_lua
+            counts = {True: 0, False: 0}  # is_lua -> 成功数
+            workers = min(len(download_tasks), self.download_concurrency)
+            await asyncio.gather(*[
+                self._download_worker(session, queue, download_sem, counts)
+                for _ in range(workers)
+            ])
             
-            download_results = await asyncio.gather(*[
-                download_one(url, path, is_lua)
-                for url, path, is_lua in download_tasks
-            ], return_exceptions=True)
-            
-            for r in download_results:
-                if isinstance(r, tuple):
-                    success, is_lua = r
-                    if success:
-                        if is_lua:
-                            lua_count += 1
-                        else:
-                            manifest_count += 1
+            lua_count = counts[True]
+            manifest_count = counts[False]
             
             result.lua_count = lua_count
             result.manifest_count = manifest_count
@@ -173,6 +403,20 @@ class BatchDownloader:
         
         return result
     
+    async def _download_worker(
+        self,
+        session: aiohttp.ClientSession,
+        queue: asyncio.Queue,
+        download_sem: Semaphore,
+        counts: Dict[bool, int]
+    ) -> None:
+        """下载工作协程：取空队列后退出，全局并发仍由 download_sem 限制"""
+        while not queue.empty():
+            url, path, is_lua = queue.get_nowait()
+            async with download_sem:
+                if await self._download_file(session, url, path):
+                    counts[is_lua] += 1
+    
     async def _get_files_from_api(
         self,
         session: aiohttp.ClientSession,
@@ -190,8 +434,10 @@ class BatchDownloader:
             headers["Authorization"] = f"Bearer {self.token}"
         
         try:
+            await self.rate_limiter.acquire()
             async with session.get(url, headers=headers) as response:
                 # 更新 API 剩余配额
+                self.rate_limiter.update(response.headers)
                 remaining = response.headers.get("X-RateLimit-Remaining")
                 if remaining:
                     self.api_remaining = int(remaining)
@@ -204,7 +450,7 @@ class BatchDownloader:
                 if response.status != 200:
                     return None
                 
-                return await response.json()
+                return json_loads(await response.read())
         except Exception:
             return None
     
@@ -214,20 +460,34 @@ class BatchDownloader:
         url: str,
         dest_path: Path
     ) -> bool:
-        """下载单个文件"""
+        """
+        下载单个文件
+        本地文件自上次下载后未被修改时带 If-None-Match 请求，304 时保留本地文件并视为成功
+        """
         headers = {"User-Agent": "SteamUnlocker/2.0"}
+        etag = read_etag(self.file_etags, dest_path)
+        if etag:
+            headers["If-None-Match"] = etag
         
         try:
             async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return True
                 if response.status != 200:
                     return False
                 
-                content = await response.read()
-                
-                # 写入文件
-                with open(dest_path, 'wb') as f:
-                    f.write(content)
+                # 边接收边写入临时文件，完整接收后再替换目标文件
+                f, part_path = open_part_file(dest_path)
+                try:
+                    with f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            f.write(chunk)
+                    commit_part_file(part_path, dest_path)
+                except BaseException:
+                    discard_part_file(part_path)
+                    raise
                 
+                write_etag(self.file_etags, dest_path, response.headers.get("ETag"))
                 return True
         except Exception:
             return False
@@ -1,10 +1,11 @@
 /*
-Steam Unlocker - 高并发下载器 (Go 版) v17
+Steam Unlocker - 高并发下载器 (Go 版) v18
 优化：
 1. 【重要】实现 AppID 内部清单的二级并行：如果一个 Lua 脚本包含多个清单 ID，它们现在会并发下载，不再排队。
 2. 增加下载重试机制 (3次随机退避)，大幅提高 GitHub 网络波动的容错率。
 3. 优化进度统计，确保在二级并行下结果依然准确。
 4. 延续 v16 的“原名保存”逻辑。
+5. 结果改为 NDJSON 逐行输出：每个游戏完成即输出 {"type":"result"}，结束时输出 {"type":"summary"}。
 */
 package main
 
@@ -34,16 +35,20 @@ type Config struct {
 }
 
 type AppResult struct {
+	Type     string `json:"type"`
 	AppID    string `json:"app_id"`
 	Lua      int    `json:"lua"`
 	Manifest int    `json:"manifest"`
 	Error    string `json:"error,omitempty"`
 }
 
-type Result struct {
-	Success   bool        `json:"success"`
-	Results   []AppResult `json:"results"`
-	TotalTime float64     `json:"total_time_seconds"`
+// Summary 结束帧：结果已按 AppResult 逐行输出 (NDJSON)，此处只汇总
+type Summary struct {
+	Type      string  `json:"type"`
+	Success   bool    `json:"success"`
+	Total     int     `json:"total"`
+	TotalTime float64 `json:"total_time_seconds"`
+	Error     string  `json:"error,omitempty"`
 }
 
 const (
@@ -98,18 +103,26 @@ func main() {
 		os.MkdirAll(config.ManifestDir, 0755)
 	}
 
-	fmt.Printf("[INFO] downloader.exe version: 2026-01-06-v17 (Internal Parallel & Retry)\n")
+	fmt.Printf("[INFO] downloader.exe version: 2026-10-17-v18 (NDJSON Results)\n")
 	os.Stdout.Sync()
 
-	results := processAllApps(config)
+	total := processAllApps(config)
 
-	output := Result{
+	emitJSON(Summary{
+		Type:      "summary",
 		Success:   true,
-		Results:   results,
+		Total:     total,
 		TotalTime: time.Since(startTime).Seconds(),
-	}
-	jsonOutput, _ := json.Marshal(output)
-	fmt.Println(string(jsonOutput))
+	})
+}
+
+// emitJSON 以单行 JSON 输出一帧，供 Python 端按 type 分派
+func emitJSON(v interface{}) {
+	data, _ := json.Marshal(v)
+	logMu.Lock()
+	fmt.Println(string(data))
+	os.Stdout.Sync()
+	logMu.Unlock()
 }
 
 func downloadFileWithRetry(url, destPath, token string) error {
@@ -160,11 +173,8 @@ func downloadFile(url, destPath, token string) error {
 	return err
 }
 
-func processAllApps(config Config) []AppResult {
-	var results []AppResult
+func processAllApps(config Config) int {
 	taskChan := make(chan string, len(config.AppIDs))
-	downloadResults := make(map[string]*AppResult)
-	var downloadMu sync.Mutex
 	var wg sync.WaitGroup
 
 	atomic.StoreInt64(&totalTaskCount, int64(len(config.AppIDs)))
@@ -174,7 +184,7 @@ func processAllApps(config Config) []AppResult {
 		go func() {
 			defer wg.Done()
 			for appID := range taskChan {
-				res := &AppResult{AppID: appID}
+				res := &AppResult{Type: "result", AppID: appID}
 
 				// 1. 下载 Lua
 				if !config.ManifestOnly && config.LuaDir != "" && config.DirectMode {
@@ -244,9 +254,8 @@ func processAllApps(config Config) []AppResult {
 					res.Manifest = int(mCount)
 				}
 
-				downloadMu.Lock()
-				downloadResults[appID] = res
-				downloadMu.Unlock()
+				// 每个游戏完成后立即输出结果帧
+				emitJSON(res)
 
 				count := atomic.AddInt64(&downloadedCount, 1)
 				if count%100 == 0 || count == totalTaskCount {
@@ -263,14 +272,9 @@ func processAllApps(config Config) []AppResult {
 	close(taskChan)
 	wg.Wait()
 
-	for _, id := range config.AppIDs {
-		if r, ok := downloadResults[id]; ok {
-			results = append(results, *r)
-		}
-	}
-	return results
+	return int(atomic.LoadInt64(&downloadedCount))
 }
 
 func outputError(msg string) {
-	fmt.Printf("{\"success\":false,\"error\":\"%s\"}\n", msg)
+	emitJSON(Summary{Type: "summary", Success: false, Error: msg})
 }
@@ -18,42 +18,241 @@ DLC 获取并添加工具
 """
 import os
 import re
+import json
 import time
+import mmap
+import random
+import asyncio
+import aiohttp
 import requests
 from typing import List, Set, Dict, Any, Optional, Callable
 import pathlib
 
+# 优先使用 orjson 解析 appdetails 响应 (直接接受 bytes)，未安装时回退到标准库
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
-def get_dlc_list(app_id: str, retry: int = 3) -> List[str]:
+
+# 匹配 addappid(id 的正则
+APPID_PATTERN = re.compile(rb'addappid\s*\(\s*(\d+)', re.IGNORECASE)
+
+# 大于该大小的 Lua 文件使用 mmap 扫描，小文件直接读取更省
+MMAP_THRESHOLD = 16 * 1024
+
+# 批量获取时同时进行的 appdetails 请求数
+FETCH_CONCURRENCY = 8
+
+# Steam appdetails 请求速率上限 (令牌桶): 每 STEAM_RATE_PERIOD 秒最多 STEAM_RATE_LIMIT 次
+STEAM_RATE_LIMIT = 200
+STEAM_RATE_PERIOD = 60.0
+
+# 重试等待: 指数退避 (上限 60 秒) 加随机抖动，避免并发请求同时重试
+RETRY_MAX_DELAY = 60.0
+RETRY_JITTER = 0.5
+
+# DLC 列表本地缓存: {app_id: {"time": 获取时间戳, "dlc": [...], "etag": ..., "lm": ...}}
+# DLC 列表很少变化，缓存 24 小时；空结果 (可能是获取失败) 只缓存 1 小时
+# 过期后带上 ETag / Last-Modified 条件请求，304 时直接沿用缓存
+DLC_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "steam_unlocker", "dlc_cache.json")
+DLC_CACHE_TTL = 24 * 3600
+DLC_EMPTY_CACHE_TTL = 3600
+
+
+class SteamRateLimiter:
+    """
+    令牌桶限速，批量获取时所有请求共用一个实例
+    令牌充足时不等待；用尽后按补充速率排队
+    """
+    
+    def __init__(self, rate: int = STEAM_RATE_LIMIT, period: float = STEAM_RATE_PERIOD):
+        self.rate = rate
+        self.period = period
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+    
+    async def acquire(self) -> None:
+        """发起请求前调用"""
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.period)
+        self.updated = now
+        # 先预留令牌再等待 (中间没有 await)，并发调用按顺序排队
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens * self.period / self.rate)
+
+
+def retry_delay(attempt: int) -> float:
+    """第 attempt 次 (从 0 开始) 失败后的等待秒数"""
+    return min(RETRY_MAX_DELAY, 2 ** attempt) + random.uniform(0, RETRY_JITTER)
+
+
+def load_dlc_cache() -> Dict[str, Dict[str, Any]]:
+    """加载 DLC 列表缓存，不存在或损坏时返回空字典"""
+    try:
+        with open(DLC_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except:
+        return {}
+
+
+def save_dlc_cache(cache: Dict[str, Dict[str, Any]]) -> None:
+    """保存 DLC 列表缓存"""
+    try:
+        os.makedirs(os.path.dirname(DLC_CACHE_FILE), exist_ok=True)
+        with open(DLC_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"保存 DLC 缓存失败: {e}")
+
+
+def cached_dlc_list(app_id: str, cache: Optional[Dict[str, Dict[str, Any]]]) -> Optional[List[str]]:
+    """返回未过期的缓存 DLC 列表，没有或已过期时返回 None"""
+    entry = cache.get(str(app_id)) if cache is not None else None
+    if not entry:
+        return None
+    dlc_list = entry.get("dlc") or []
+    ttl = DLC_CACHE_TTL if dlc_list else DLC_EMPTY_CACHE_TTL
+    if time.time() - entry.get("time", 0) > ttl:
+        return None
+    return list(dlc_list)
+
+
+def remember_dlc_list(
+    app_id: str,
+    dlc_list: List[str],
+    cache: Optional[Dict[str, Dict[str, Any]]],
+    headers: Optional[Any] = None
+) -> None:
+    """记录本次获取的 DLC 列表，以及响应头中的 ETag / Last-Modified"""
+    if cache is None:
+        return
+    entry = {"time": time.time(), "dlc": dlc_list}
+    if headers is not None:
+        if headers.get("ETag"):
+            entry["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            entry["lm"] = headers["Last-Modified"]
+    cache[str(app_id)] = entry
+
+
+def fallback_dlc_list(app_id: str, cache: Optional[Dict[str, Dict[str, Any]]]) -> List[str]:
+    """所有重试都失败时调用：已有的缓存条目（含 ETag / Last-Modified）原样保留并返回其列表，
+    只有从未缓存过的 App 才写入空的负缓存"""
+    if cache is None:
+        return []
+    entry = cache.get(str(app_id))
+    if entry:
+        return list(entry.get("dlc") or [])
+    remember_dlc_list(app_id, [], cache)
+    return []
+
+
+def dlc_request_headers(app_id: str, cache: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, str]:
+    """根据缓存的 ETag / Last-Modified 生成条件请求头"""
+    entry = cache.get(str(app_id)) if cache is not None else None
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("lm"):
+            headers["If-Modified-Since"] = entry["lm"]
+    return headers
+
+
+def revalidated_dlc_list(app_id: str, cache: Dict[str, Dict[str, Any]]) -> List[str]:
+    """服务器返回 304 时刷新缓存时间并返回缓存的 DLC 列表"""
+    entry = cache[str(app_id)]
+    entry["time"] = time.time()
+    return list(entry.get("dlc") or [])
+
+
+def get_dlc_list(app_id: str, retry: int = 3, cache: Optional[Dict[str, Dict[str, Any]]] = None) -> List[str]:
     """
     从 Steam API 获取游戏的所有 DLC App ID
     
     Args:
         app_id: 游戏的 App ID
         retry: 重试次数
+        cache: load_dlc_cache() 返回的缓存，提供时优先使用未过期的结果并原地更新；
+               已过期的条目会发送条件请求，304 时沿用缓存
         
     Returns:
         DLC App ID 列表
     """
+    dlc_list = cached_dlc_list(app_id, cache)
+    if dlc_list is not None:
+        return dlc_list
+    
     url = f"https://store.steampowered.com/api/appdetails?appids={app_id}"
     
     for attempt in range(retry):
         try:
-            response = requests.get(url, timeout=15)
+            response = requests.get(url, headers=dlc_request_headers(app_id, cache), timeout=15)
+            if response.status_code == 304:
+                return revalidated_dlc_list(app_id, cache)
             if response.status_code == 200:
-                data = response.json()
-                if data.get(str(app_id), {}).get("success"):
-                    dlc_list = data[str(app_id)].get("data", {}).get("dlc", [])
-                    return [str(d) for d in dlc_list]
-            # 请求限制，等待后重试
+                dlc_list = parse_dlc_response(app_id, json_loads(response.content))
+                if dlc_list is not None:
+                    remember_dlc_list(app_id, dlc_list, cache, response.headers)
+                    return dlc_list
+            # 请求限制 (429) 或服务器错误，退避后重试
             if attempt < retry - 1:
-                time.sleep(1)
+                time.sleep(retry_delay(attempt))
         except Exception as e:
             if attempt < retry - 1:
-                time.sleep(1)
+                time.sleep(retry_delay(attempt))
             continue
     
-    return []
+    return fallback_dlc_list(app_id, cache)
+
+
+def parse_dlc_response(app_id: str, data: dict) -> Optional[List[str]]:
+    """从 appdetails 响应中提取 DLC 列表，响应无效时返回 None"""
+    if data.get(str(app_id), {}).get("success"):
+        dlc_list = data[str(app_id)].get("data", {}).get("dlc", [])
+        return [str(d) for d in dlc_list]
+    return None
+
+
+async def get_dlc_list_async(
+    session: aiohttp.ClientSession,
+    app_id: str,
+    retry: int = 3,
+    cache: Optional[Dict[str, Dict[str, Any]]] = None,
+    rate_limiter: Optional[SteamRateLimiter] = None
+) -> List[str]:
+    """get_dlc_list 的异步版本，复用调用方的会话，每次请求前经过共享的限速器"""
+    dlc_list = cached_dlc_list(app_id, cache)
+    if dlc_list is not None:
+        return dlc_list
+    
+    url = f"https://store.steampowered.com/api/appdetails?appids={app_id}"
+    
+    for attempt in range(retry):
+        try:
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            async with session.get(url, headers=dlc_request_headers(app_id, cache)) as response:
+                if response.status == 304:
+                    return revalidated_dlc_list(app_id, cache)
+                if response.status == 200:
+                    dlc_list = parse_dlc_response(app_id, json_loads(await response.read()))
+                    if dlc_list is not None:
+                        remember_dlc_list(app_id, dlc_list, cache, response.headers)
+                        return dlc_list
+            # 请求限制 (429) 或服务器错误，退避后重试
+            if attempt < retry - 1:
+                await asyncio.sleep(retry_delay(attempt))
+        except Exception as e:
+            if attempt < retry - 1:
+                await asyncio.sleep(retry_delay(attempt))
+            continue
+    
+    return fallback_dlc_list(app_id, cache)
 
 
 def get_existing_appids(lua_path: str) -> Set[str]:
@@ -66,17 +265,15 @@ def get_existing_appids(lua_path: str) -> Set[str]:
     Returns:
         已存在的 App ID 集合
     """
-    existing = set()
-    pattern = re.compile(r'addappid\s*\(\s*(\d+)', re.IGNORECASE)
-    
+    # 直接在 bytes / mmap 上匹配，只解码匹配到的数字，无需解码整个文件
     try:
-        content = pathlib.Path(lua_path).read_text(encoding='utf-8', errors='ignore')
-        matches = pattern.findall(content)
-        existing = set(matches)
+        with open(lua_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= MMAP_THRESHOLD:
+                return {m.decode() for m in APPID_PATTERN.findall(f.read())}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return {m.decode() for m in APPID_PATTERN.findall(mm)}
     except Exception:
-        pass
-    
-    return existing
+        return set()
 
 
 def add_dlc_to_lua(lua_path: str, dlc_ids: List[str], progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
@@ -97,27 +294,27 @@ def add_dlc_to_lua(lua_path: str, dlc_ids: List[str], progress_callback: Optiona
     # 获取已存在的 App ID
     existing = get_existing_appids(lua_path)
     
-    # 过滤需要添加的 DLC
-    to_add = [d for d in dlc_ids if d not in existing]
+    # 过滤需要添加的 DLC (dict.fromkeys 保序去重，避免重复 ID 被写入两次)
+    to_add = [d for d in dict.fromkeys(dlc_ids) if d not in existing]
     skipped = len(dlc_ids) - len(to_add)
     
     if not to_add:
         return {"success": True, "added": 0, "skipped": skipped, "message": "无新 DLC 需要添加"}
     
     try:
-        # 读取现有内容
-        content = pathlib.Path(lua_path).read_text(encoding='utf-8', errors='ignore')
-        
-        # 生成新的 DLC 条目
-        new_lines = [f"addappid({dlc_id})" for dlc_id in to_add]
-        
-        # 追加到文件末尾
-        if content and not content.endswith('\n'):
-            content += '\n'
-        content += '\n'.join(new_lines) + '\n'
+        # 只需检查最后一个字节是否为换行，无需读取整个文件
+        need_newline = False
+        with open(lua_path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                need_newline = f.read(1) != b'\n'
         
-        # 写入文件
-        pathlib.Path(lua_path).write_text(content, encoding='utf-8')
+        # 以追加模式写入新的 DLC 条目，不重写已有内容
+        with open(lua_path, 'a', encoding='utf-8') as f:
+            if need_newline:
+                f.write('\n')
+            f.write('\n'.join(f"addappid({dlc_id})" for dlc_id in to_add))
+            f.write('\n')
         
         if progress_callback:
             progress_callback(f"已添加 {len(to_add)} 个 DLC 到 {os.path.basename(lua_path)}")
@@ -152,8 +349,10 @@ def run_fetch_single(app_id: str, lua_dir: str, progress_callback: Optional[Call
     
     log(f"正在获取 {app_id} 的 DLC 列表...")
     
-    # 获取 DLC 列表
-    dlc_list = get_dlc_list(app_id)
+    # 获取 DLC 列表 (优先使用本地缓存)
+    cache = load_dlc_cache()
+    dlc_list = get_dlc_list(app_id, cache=cache)
+    save_dlc_cache(cache)
     
     if not dlc_list:
         return {"success": True, "dlc_count": 0, "added": 0, 
@@ -184,6 +383,11 @@ def run_fetch_all(lua_dir: str, progress_callback: Optional[Callable] = None) ->
     Returns:
         {"success": bool, "total_games": int, "total_dlc": int, "total_added": int, "message": str}
     """
+    return asyncio.run(run_fetch_all_async(lua_dir, progress_callback))
+
+
+async def run_fetch_all_async(lua_dir: str, progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+    """run_fetch_all 的异步实现：共享一个会话并发请求，写文件在当前协程按完成顺序进行"""
     def log(msg):
         if progress_callback:
             progress_callback(msg)
@@ -214,32 +418,41 @@ def run_fetch_all(lua_dir: str, progress_callback: Optional[Callable] = None) ->
     processed = 0
     errors = []
     
-    for i, app_id in enumerate(game_app_ids):
-        try:
-            log(f"[{i+1}/{len(game_app_ids)}] 正在处理 {app_id}...")
-            
-            # 获取 DLC 列表
-            dlc_list = get_dlc_list(app_id)
-            
-            if dlc_list:
-                lua_file = os.path.join(lua_dir, f"{app_id}.lua")
-                result = add_dlc_to_lua(lua_file, dlc_list)
+    # 并发数由信号量限制，替代逐个请求之间的固定休眠
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+    rate_limiter = SteamRateLimiter()
+    cache = load_dlc_cache()
+    connector = aiohttp.TCPConnector(limit=FETCH_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=15)
+    
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def fetch(app_id):
+            async with sem:
+                return app_id, await get_dlc_list_async(session, app_id, cache=cache, rate_limiter=rate_limiter)
+        
+        for i, next_done in enumerate(asyncio.as_completed([fetch(a) for a in game_app_ids])):
+            app_id = None
+            try:
+                app_id, dlc_list = await next_done
+                log(f"[{i+1}/{len(game_app_ids)}] 已获取 {app_id}")
                 
-                total_dlc += len(dlc_list)
-                total_added += result.get("added", 0)
+                if dlc_list:
+                    lua_file = os.path.join(lua_dir, f"{app_id}.lua")
+                    result = add_dlc_to_lua(lua_file, dlc_list)
+                    
+                    total_dlc += len(dlc_list)
+                    total_added += result.get("added", 0)
+                    
+                    if result["added"] > 0:
+                        log(f"  → 添加 {result['added']} 个 DLC")
                 
-                if result["added"] > 0:
-                    log(f"  → 添加 {result['added']} 个 DLC")
-            
-            processed += 1
-            
-            # 避免请求过快，简单限流
-            if i < len(game_app_ids) - 1:
-                time.sleep(0.3)
+                processed += 1
                 
-        except Exception as e:
-            errors.append(f"{app_id}: {e}")
-            continue
+            except Exception as e:
+                errors.append(f"{app_id}: {e}")
+                continue
+    
+    save_dlc_cache(cache)
     
     message = f"处理完成！共 {processed} 个游戏，获取 {total_dlc} 个 DLC，新增 {total_added} 个"
     if errors:
@@ -12,12 +12,32 @@
 import os
 import sys
 import re
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 
-# 匹配 setManifestid 的正则
-MANIFEST_PATTERN = re.compile(r'setManifestid\s*\(', re.IGNORECASE)
-# 匹配被注释的 setManifestid
-COMMENTED_MANIFEST_PATTERN = re.compile(r'--\s*setManifestid\s*\(', re.IGNORECASE)
+# 一次扫描找出所有 setManifestid(，commented 组非空表示紧跟在 "--" 之后 (被注释)
+# 标记都是 ASCII，直接在 bytes / mmap 上匹配，无需解码
+MANIFEST_SCAN_PATTERN = re.compile(rb'(?P<commented>--\s*)?setManifestid\s*\(', re.IGNORECASE)
+MANIFEST_PATTERN = re.compile(rb'setManifestid\s*\(', re.IGNORECASE)
+# 行内注释，两种调用都存在时去掉注释后再确认是否有未注释的调用
+COMMENT_PATTERN = re.compile(rb'--.*')
+
+# 文本路径使用的 str 版本 (\s 按 Unicode 匹配)
+MANIFEST_SCAN_TEXT_PATTERN = re.compile(r'(?P<commented>--\s*)?setManifestid\s*\(', re.IGNORECASE)
+MANIFEST_TEXT_PATTERN = re.compile(r'setManifestid\s*\(', re.IGNORECASE)
+COMMENT_TEXT_PATTERN = re.compile(r'--.*')
+
+# 字节正则的 \s 只认 ASCII 空白，且不把单独的 \r 当作换行
+# 含非 ASCII 字节、\x1c-\x1f 或单独 \r 的文件解码后按文本检查，无法解码时与按文本读取一样视为无清单
+TEXT_PATH_RE = re.compile(rb'[\x1c-\x1f\x80-\xff]|\r(?!\n)')
+
+# 大于该大小的文件使用 mmap 扫描，小文件直接读取更省
+MMAP_THRESHOLD = 16 * 1024
+
+# 每个线程最多排队的检查任务数，限制在途 future 的数量
+SUBMIT_WINDOW_PER_WORKER = 4
 
 
 def check_has_manifest(file_path: str) -> tuple:
@@ -26,33 +46,59 @@ def check_has_manifest(file_path: str) -> tuple:
     返回: (文件路径, 有清单, 被注释)
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-        except:
-            return (file_path, False, False)
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= MMAP_THRESHOLD:
+                return scan_manifest_calls(file_path, f.read())
+            # 大文件直接在映射的页缓存上扫描，不复制到 Python 对象
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return scan_manifest_calls(file_path, mm)
     except:
         return (file_path, False, False)
+
+
+def decode_lua(buf) -> str:
+    """按 UTF-8、GBK 的顺序解码 bytes 或 mmap，都失败时返回 None"""
+    data = bytes(buf)
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def scan_manifest_calls(file_path: str, buf) -> tuple:
+    """
+    在 bytes 或 mmap 上单次扫描，找到被注释的调用后提前结束
+    没有被注释的调用时，任意 setManifestid( 都算作有清单；
+    两种都有时才去掉行内注释再检查一次
+    """
+    scan_pattern, pattern, comment_pattern, empty = \
+        MANIFEST_SCAN_PATTERN, MANIFEST_PATTERN, COMMENT_PATTERN, b''
+    if TEXT_PATH_RE.search(buf):
+        buf = decode_lua(buf)
+        if buf is None:
+            return (file_path, False, False)
+        buf = buf.replace('\r\n', '\n').replace('\r', '\n')
+        scan_pattern, pattern, comment_pattern, empty = \
+            MANIFEST_SCAN_TEXT_PATTERN, MANIFEST_TEXT_PATTERN, COMMENT_TEXT_PATTERN, ''
     
-    # 检查是否有未注释的清单
-    has_active = bool(MANIFEST_PATTERN.search(content))
-    has_commented = bool(COMMENTED_MANIFEST_PATTERN.search(content))
+    has_active = False
+    has_commented = False
+    for m in scan_pattern.finditer(buf):
+        has_active = True
+        if m.group('commented') is not None:
+            has_commented = True
+            break
     
-    # 如果有注释的，需要排除它来判断是否有未注释的
-    if has_active and has_commented:
-        # 移除注释后的内容再检查
-        clean_content = re.sub(r'--.*', '', content)
-        has_active = bool(MANIFEST_PATTERN.search(clean_content))
+    if has_commented:
+        has_active = bool(pattern.search(comment_pattern.sub(empty, buf)))
     
     return (file_path, has_active, has_commented)
 
 
-def find_lua_files(directory: str, progress_callback=None) -> list:
-    """快速查找所有 Lua 文件"""
-    lua_files = []
+def find_lua_files(directory: str, progress_callback=None):
+    """快速查找所有 Lua 文件 (生成器，边扫描边产出路径)"""
     count = 0
     
     try:
@@ -64,7 +110,7 @@ def find_lua_files(directory: str, progress_callback=None) -> list:
                     for entry in it:
                         if entry.is_file():
                             if entry.name.lower().endswith('.lua'):
-                                lua_files.append(entry.path)
+                                yield entry.path
                         elif entry.is_dir():
                             stack.append(entry.path)
                         count += 1
@@ -75,8 +121,6 @@ def find_lua_files(directory: str, progress_callback=None) -> list:
     except Exception as e:
         if progress_callback:
             progress_callback(f"扫描出错: {e}")
-    
-    return lua_files
 
 
 def run_find(target_dir: str, progress_callback=None) -> dict:
@@ -105,27 +149,42 @@ def run_find(target_dir: str, progress_callback=None) -> dict:
     
     log(f"开始扫描目录: {target_dir}")
     
-    # 查找所有 Lua 文件
+    # 查找所有 Lua 文件 (目录扫描与检查同时进行，不先收集完整列表)
     if os.path.isfile(target_dir):
-        lua_files = [target_dir]
+        lua_files = iter([target_dir])
     else:
         lua_files = find_lua_files(target_dir, log)
     
-    if not lua_files:
-        return {"success": True, "total": 0, "no_manifest": [], "message": "未找到任何 Lua 文件"}
-    
-    log(f"找到 {len(lua_files)} 个 Lua 文件，开始检查...")
-    
-    # 逐个检查文件
+    # 线程池并发读取检查 (I/O 密集)，进度只在当前线程汇报
     no_manifest = []
+    total = 0
+    max_workers = min(32, (os.cpu_count() or 4) * 4)
     
-    for i, file_path in enumerate(lua_files):
-        result = check_has_manifest(file_path)
+    def collect(result):
+        nonlocal total
+        total += 1
         if not result[1]:  # 没有有效清单
             no_manifest.append((result[0], result[2]))  # (路径, 是否被注释)
         
-        if (i + 1) % 500 == 0:
-            log(f"已检查 {i + 1}/{len(lua_files)} 个文件...")
+        if total % 500 == 0:
+            log(f"已检查 {total} 个文件...")
+    
+    # executor.map 会先把生成器全部取完再返回，这里按窗口提交，
+    # 在途任务数有上限，目录扫描与文件检查交替进行
+    window = max_workers * SUBMIT_WINDOW_PER_WORKER
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for file_path in lua_files:
+            pending.append(executor.submit(check_has_manifest, file_path))
+            if len(pending) >= window:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+    
+    if not total:
+        return {"success": True, "total": 0, "no_manifest": [], "message": "未找到任何 Lua 文件"}
+    
+    log(f"共检查 {total} 个 Lua 文件")
     
     # 生成结果
     commented = sum(1 for _, c in no_manifest if c)
@@ -141,8 +200,8 @@ def run_find(target_dir: str, progress_callback=None) -> dict:
         if len(no_manifest) > 10:
             log(f"  ... 还有 {len(no_manifest) - 10} 个")
     
-    return {"success": True, "total": len(lua_files), "no_manifest": no_manifest, 
-            "message": f"检查完成，{len(no_manifest)}/{len(lua_files)} 个文件无有效清单"}
+    return {"success": True, "total": total, "no_manifest": no_manifest, 
+            "message": f"检查完成，{len(no_manifest)}/{total} 个文件无有效清单"}
 
 
 def main():
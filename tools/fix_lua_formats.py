@@ -1,9 +1,112 @@
 import os
 import re
+import time
+import mmap
 import pathlib
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, Any, List, Optional, Callable, Tuple
 
 
+# 一次扫描同时匹配两种需要修复的格式，按匹配到的分组分派:
+#   none_id: addappid(id, num, "None") 格式 (不区分大小写)
+#   hash_id/hash_num/hash_val: addappid(id, num, "hash") 格式 (包括 0)
+FORMAT_PATTERN = re.compile(
+    r'(?i:addappid)\s*\(\s*(?P<none_id>\d+)\s*,\s*\d+\s*,\s*["\'](?i:None)["\']\s*\)'
+    r'|addappid\s*\(\s*(?P<hash_id>\d+)\s*,\s*(?P<hash_num>\d+)\s*,\s*(?P<hash_val>["\'][a-fA-F0-9]+["\'])\s*\)'
+)
+
+# 预检: 不含 addappid (不区分大小写) 的文件不可能需要修复，跳过解码和替换
+ADDAPPID_BYTES_PATTERN = re.compile(rb'addappid', re.IGNORECASE)
+
+# 大于该大小的文件使用 mmap 预检，小文件直接读取更省
+MMAP_THRESHOLD = 16 * 1024
+
+# 进度回调的最小间隔 (秒)，回调可能是 Qt 信号或跨进程通信，按时间节流
+PROGRESS_INTERVAL = 0.1
+
+# 文件数不超过该值时直接在当前进程处理，避免进程池启动开销
+PARALLEL_THRESHOLD = 64
+
+
+def fix_format_file(file_path: pathlib.Path) -> Tuple[pathlib.Path, bool, int, str]:
+    """
+    修复单个 Lua 文件的 addappid 格式 (在子进程中执行，不能使用回调)
+    返回: (文件路径, 是否修改, 修正数量, 错误信息)
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= MMAP_THRESHOLD:
+                raw = f.read()
+                if not ADDAPPID_BYTES_PATTERN.search(raw):
+                    return (file_path, False, 0, "")
+            else:
+                # 大文件先在映射上预检，不含 addappid 时不复制内容
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if not ADDAPPID_BYTES_PATTERN.search(mm):
+                        return (file_path, False, 0, "")
+                    raw = mm[:]
+        
+        # 与 read_text 一致: 忽略非法字节并统一换行符
+        content = raw.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+        
+        # 含 addappid 但没有任何需要修复的格式时，search 即可判定，无需构建替换结果
+        if not FORMAT_PATTERN.search(content):
+            return (file_path, False, 0, "")
+        
+        original_content = content
+        file_replacements = 0
+        
+        # 使用计数器生成递增序号
+        counter = [0]  # 使用列表以便在闭包中修改
+        
+        def replace_format(match):
+            nonlocal file_replacements
+            
+            # 修复 1: addappid(id, x, "None") -> addappid(id)
+            none_id = match.group('none_id')
+            if none_id is not None:
+                file_replacements += 1
+                return f'addappid({none_id})'
+            
+            # 修复 2: addappid(id, x, "hash") -> addappid(id, 递增序号, "hash")
+            app_id = match.group('hash_id')
+            old_num = match.group('hash_num')
+            hash_val = match.group('hash_val')
+            new_num = counter[0]
+            counter[0] += 1
+            
+            if old_num != str(new_num):
+                file_replacements += 1
+            
+            return f'addappid({app_id}, {new_num}, {hash_val})'
+        
+        # 单次 sub 完成两种修复
+        content = FORMAT_PATTERN.sub(replace_format, content)
+        
+        # 只有内容变化时才写入
+        if content != original_content:
+            file_path.write_text(content, encoding='utf-8')
+            return (file_path, True, file_replacements, "")
+        return (file_path, False, 0, "")
+    except Exception as e:
+        return (file_path, False, 0, str(e))
+
+
+def map_files(func, files: list):
+    """
+    对文件列表逐个执行 func，按原顺序产出结果
+    文件较多时使用进程池并行 (正则替换为 CPU 密集型)
+    """
+    if len(files) <= PARALLEL_THRESHOLD:
+        yield from map(func, files)
+        return
+    
+    workers = os.cpu_count() or 1
+    chunksize = max(1, min(32, len(files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(func, files, chunksize=chunksize)
+
+
 def run_fix_formats(lua_dir: str, progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
     """
     识别并修复 Lua 文件中 addappid 的格式问题：
@@ -16,17 +119,6 @@ def run_fix_formats(lua_dir: str, progress_callback: Optional[Callable[[str], No
     if not lua_path.exists():
         return {"success": False, "message": f"目录不存在: {lua_dir}"}
 
-    # 匹配 addappid(id, num, "None") 格式
-    pattern_none = re.compile(
-        r'addappid\s*\(\s*(\d+)\s*,\s*\d+\s*,\s*["\']None["\']\s*\)',
-        re.IGNORECASE
-    )
-    
-    # 匹配 addappid(id, num, "hash") 格式 (包括 0)
-    pattern_hash = re.compile(
-        r'addappid\s*\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(["\'][a-fA-F0-9]+["\'])\s*\)'
-    )
-
     fixed_files = 0
     total_files = 0
     total_replacements = 0
@@ -35,53 +127,22 @@ def run_fix_formats(lua_dir: str, progress_callback: Optional[Callable[[str], No
     lua_files = [f for f in lua_path.glob("*.lua") if f.stem.isdigit()]
     total_count = len(lua_files)
     
-    for i, file_path in enumerate(lua_files):
-        try:
-            total_files += 1
-            if progress_callback and i % 100 == 0:
-                progress_callback(f"正在检查 ({i}/{total_count}): {file_path.name}")
-            
-            content = file_path.read_text(encoding='utf-8', errors='ignore')
-            original_content = content
-            file_replacements = 0
-            
-            # 修复 1: addappid(id, x, "None") -> addappid(id)
-            def replace_none(match):
-                nonlocal file_replacements
-                file_replacements += 1
-                app_id = match.group(1)
-                return f'addappid({app_id})'
-            
-            content = pattern_none.sub(replace_none, content)
-            
-            # 修复 2: addappid(id, x, "hash") -> addappid(id, 递增序号, "hash")
-            # 使用计数器生成递增序号
-            counter = [0]  # 使用列表以便在闭包中修改
-            
-            def replace_hash_sequential(match):
-                nonlocal file_replacements
-                app_id = match.group(1)
-                old_num = match.group(2)
-                hash_val = match.group(3)
-                new_num = counter[0]
-                counter[0] += 1
-                
-                if old_num != str(new_num):
-                    file_replacements += 1
-                
-                return f'addappid({app_id}, {new_num}, {hash_val})'
-            
-            content = pattern_hash.sub(replace_hash_sequential, content)
-            
-            # 只有内容变化时才写入
-            if content != original_content:
-                file_path.write_text(content, encoding='utf-8')
-                fixed_files += 1
-                total_replacements += file_replacements
-                
-        except Exception as e:
+    # 并行修复文件，进度在主进程按时间间隔汇报 (最后一个文件总会汇报)
+    last_emit = 0.0
+    for i, (file_path, changed, file_replacements, error) in enumerate(map_files(fix_format_file, lua_files)):
+        total_files += 1
+        if progress_callback:
+            now = time.monotonic()
+            if now - last_emit >= PROGRESS_INTERVAL or i == total_count - 1:
+                last_emit = now
+                progress_callback(f"正在检查 ({i + 1}/{total_count}): {file_path.name}")
+        
+        if error:
             if progress_callback:
-                progress_callback(f"处理文件 {file_path.name} 出错: {e}")
+                progress_callback(f"处理文件 {file_path.name} 出错: {error}")
+        elif changed:
+            fixed_files += 1
+            total_replacements += file_replacements
 
     result_msg = f"扫描完成！共处理 {total_files} 个文件。\n修复了 {fixed_files} 个文件，共 {total_replacements} 处修正。"
     return {
@@ -1,5 +1,6 @@
 import os
 import re
+import mmap
 import json
 import subprocess
 import pathlib
@@ -7,6 +8,36 @@ import sys
 import tempfile
 from typing import Dict, List
 
+# 优先使用 orjson 序列化下载器配置 (直接输出 UTF-8 bytes)，未安装时回退到标准库
+try:
+    import orjson
+    json_dumps = orjson.dumps
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+# 正则：setManifestid(depot_id, "manifestid") 或 setManifestid(depot_id, manifestid)
+# Lua 中这些标记都是 ASCII，直接在 bytes / mmap 上匹配，无需解码
+MANIFEST_PATTERN = re.compile(rb'setManifestid\s*\(\s*(\d+)\s*,\s*["\']?(\d+)["\']?\s*\)')
+
+# 大于该大小的文件使用 mmap 扫描，小文件直接读取更省
+MMAP_THRESHOLD = 16 * 1024
+
+
+def find_manifest_pairs(file_path) -> List[tuple]:
+    """返回文件中所有 (depot_id, manifest_id) 字符串对"""
+    with open(file_path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size <= MMAP_THRESHOLD:
+            buf = fh.read()
+            if buf.find(b'setManifestid') < 0:
+                return []
+            return [(d.decode(), m.decode()) for d, m in MANIFEST_PATTERN.findall(buf)]
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b'setManifestid') < 0:
+                return []
+            return [(d.decode(), m.decode()) for d, m in MANIFEST_PATTERN.findall(mm)]
+
+
 def run_recovery(lua_dir: str, output_manifest_dir: str, downloader_path: str, repo: str, token: str = ""):
     """
     补全工具 V15 版：
@@ -22,9 +53,6 @@ def run_recovery(lua_dir: str, output_manifest_dir: str, downloader_path: str, r
     app_data = {}
     app_ids = []
     
-    # 正则：setManifestid(depot_id, "manifestid") 或 setManifestid(depot_id, manifestid)
-    manifest_pattern = re.compile(r'setManifestid\s*\(\s*(\d+)\s*,\s*["\']?(\d+)["\']?\s*\)')
-    
     print(f"正在扫描 {lua_dir} 中的 Lua 文件...")
     lua_files = list(lua_path.glob("*.lua"))
     total_files = len(lua_files)
@@ -35,17 +63,13 @@ def run_recovery(lua_dir: str, output_manifest_dir: str, downloader_path: str, r
             
         main_appid = f.stem # 比如 2087470.lua -> 2087470 (对应分支)
         try:
-            content = f.read_text(encoding='utf-8', errors='ignore')
-            matches = manifest_pattern.findall(content)
-            for depot_id, mid in matches:
-                if main_appid not in app_data:
-                    app_data[main_appid] = []
-                    app_ids.append(main_appid)
-                
-                # 存入 DepotID_ManifestID，Go v15 会尝试这个及其他变体
-                full_item = f"{depot_id}_{mid}"
-                if full_item not in app_data[main_appid]:
-                    app_data[main_appid].append(full_item)
+            # 存入 DepotID_ManifestID，Go v15 会尝试这个及其他变体
+            # dict.fromkeys 保序去重，避免逐个 "not in list" 的 O(n²) 查找
+            items = list(dict.fromkeys(f"{depot_id}_{mid}" for depot_id, mid in find_manifest_pairs(f)))
+            if items:
+                # 每个 Lua 文件名唯一，对应一个分支
+                app_data[main_appid] = items
+                app_ids.append(main_appid)
         except Exception as e:
             print(f"解析 {f.name} 失败: {e}")
 
@@ -67,42 +91,44 @@ def run_recovery(lua_dir: str, output_manifest_dir: str, downloader_path: str, r
         "manifest_only": True
     }
     
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as tmp:
-        json.dump(config, tmp)
+    with tempfile.NamedTemporaryFile(mode='wb', suffix='.json', delete=False) as tmp:
+        tmp.write(json_dumps(config))
         temp_config_path = tmp.name
 
     print(f"正在启动 V15 下载器 (配置已载入)...")
     try:
-        # 使用 -config 标志调用
+        # 使用 -config 标志调用 (以字节读取，自行按行切分)
         process = subprocess.Popen(
             [downloader_path, "-config", temp_config_path],
             stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding='utf-8',
-            bufsize=1
+            stderr=subprocess.STDOUT
         )
         
-        # 实时解析进度输出
+        def handle_line(raw: bytes):
+            # 成功/失败逐条输出量很大且不显示，不解码直接跳过
+            if b"[PROGRESS]" not in raw and (b"[DOWNLOAD_SUCCESS]" in raw or b"[DOWNLOAD_FAIL]" in raw):
+                return
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if not line:
+                return
+            if "[PROGRESS]" in line:
+                p = line.split("]")[-1].strip()
+                print(f"\r🚀 下载进度: {p}", end="", flush=True)
+            elif not line.startswith("{"):
+                print(f"\n{line}")
+        
+        # 实时解析进度输出: 每次读取管道中已有的全部数据 (最多 64KB)，而不是逐行阻塞读取
+        pending = b""
         while True:
-            line = process.stdout.readline()
-            if not line and process.poll() is not None:
+            data = process.stdout.read1(65536)
+            if not data:
                 break
-            if line:
-                line = line.strip()
-                if "[PROGRESS]" in line:
-                    p = line.split("]")[-1].strip()
-                    print(f"\r🚀 下载进度: {p}", end="", flush=True)
-                elif "[DOWNLOAD_SUCCESS]" in line:
-                    # 如果需要调试，可以取消下面注释
-                    # print(f"\n✅ {line}")
-                    pass
-                elif "[DOWNLOAD_FAIL]" in line:
-                    # 如果 404 太频繁可以略过，或者只打印重要的
-                    # print(f"\n❌ {line}")
-                    pass
-                elif not line.startswith("{"):
-                    print(f"\n{line}")
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            for raw in lines:
+                handle_line(raw)
+        if pending:
+            handle_line(pending)
 
         process.wait()
         print(f"\n任务圆满结束。")
@@ -8,70 +8,200 @@
 
 命令行:
     python replace_manifest.py [目录]
+    python replace_manifest.py [目录] --parallel-scan   # 网络共享等高延迟目录并行遍历
 """
 import os
 import sys
 import re
+import json
+import mmap
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 
-def replace_in_file(file_path: str) -> tuple:
+# 没有 -- 前缀的 setManifestid (未被注释)
+ACTIVE_MANIFEST_PATTERN = re.compile(rb'(?<!--)setManifestid')
+
+# 扫描时跳过的目录 (如 ManifestHub 仓库的 .git 对象目录，条目极多且没有 Lua 文件)
+SKIP_DIRS = {'.git', '__pycache__', 'node_modules'}
+
+# 小于该大小的文件不可能包含 setManifestid，无需读取
+MIN_MATCH_SIZE = len(b'setManifestid')
+
+# 大于该大小的文件先在 mmap 上预检，确认需要修改时才读入内存
+MMAP_THRESHOLD = 16 * 1024
+
+# 已确认没有未注释 setManifestid 的文件: {绝对路径: [mtime_ns, size]}
+# 再次运行时 mtime 和大小都未变化的文件直接跳过；扫描目录时删除该目录下已不存在的文件的记录
+REPLACE_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "steam_unlocker", "replace_manifest_cache.json")
+
+# 每处理多少个文件汇报一次进度
+PROGRESS_EVERY = 500
+
+# 结果中列出的已修改文件数
+SHOW_MODIFIED_LIMIT = 10
+
+# 开启并行遍历时的线程数 (网络共享上每个 scandir 调用都要等待一次往返)
+SCAN_WORKERS = 8
+
+
+def fadvise(fd: int, advice: str) -> None:
+    """向内核提示文件访问方式 (仅 POSIX 平台支持，Windows 上不做任何事)"""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+        except OSError:
+            pass
+
+
+def load_replace_cache() -> dict:
+    """加载无需处理的文件记录，不存在或损坏时返回空字典"""
+    try:
+        with open(REPLACE_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except:
+        return {}
+
+
+def save_replace_cache(cache: dict) -> None:
+    """保存无需处理的文件记录"""
+    try:
+        os.makedirs(os.path.dirname(REPLACE_CACHE_FILE), exist_ok=True)
+        with open(REPLACE_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except Exception as e:
+        print(f"保存缓存失败: {e}")
+
+
+def prune_replace_cache(cache: dict, target_dir: str, seen: set) -> None:
+    """删除 target_dir 下本次扫描没有见到的文件记录 (已删除或移走)，避免缓存只增不减"""
+    prefix = os.path.join(os.path.abspath(target_dir), '')
+    for key in [k for k in cache if k.startswith(prefix) and k not in seen]:
+        del cache[key]
+
+
+def write_atomic(file_path: str, data: bytes) -> None:
     """
-    替换文件中的 setManifestid 为 --setManifestid
-    返回: (文件路径, 是否修改, 修改数量)
+    先写入同目录下的临时文件再替换原文件，中途被中断时原文件保持完整
+    临时文件沿用原文件的权限
     """
+    directory, name = os.path.split(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory)
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+        os.replace(tmp_path, file_path)
+    except:
         try:
-            with open(file_path, 'r', encoding='gbk') as f:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def replace_in_file(file_path: str, size: int = None) -> tuple:
+    """
+    替换文件中的 setManifestid 为 --setManifestid
+    size: 已知的文件大小，过小时不读取文件
+    返回: (文件路径, 是否修改, 修改数量, 是否已确认不含未注释的 setManifestid)
+    """
+    if size is not None and size < MIN_MATCH_SIZE:
+        return (file_path, False, 0, True)
+    
+    # 标记都是 ASCII，直接按 bytes 处理，无需解码 (也保留文件原有的编码和换行符)
+    try:
+        with open(file_path, 'rb') as f:
+            fadvise(f.fileno(), 'POSIX_FADV_SEQUENTIAL')
+            if size is None:
+                size = os.fstat(f.fileno()).st_size
+            if size <= MMAP_THRESHOLD:
                 content = f.read()
-        except:
-            return (file_path, False, 0)
+                # 不含 setManifestid 的文件 (大多数) 用子串查找直接排除，无需运行正则
+                found = b'setManifestid' in content
+            else:
+                # 大文件直接在映射上查找未注释的调用，没有时不复制内容
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    found = ACTIVE_MANIFEST_PATTERN.search(mm) is not None
+                    content = mm[:] if found else b''
+            # 只扫描不修改的文件不必留在页缓存中
+            if not found:
+                fadvise(f.fileno(), 'POSIX_FADV_DONTNEED')
+                return (file_path, False, 0, True)
     except:
-        return (file_path, False, 0)
+        return (file_path, False, 0, False)
     
-    # 计算替换前后的数量
-    # 只替换没有 -- 前缀的 setManifestid
-    pattern = r'(?<!--)setManifestid'
-    matches = len(re.findall(pattern, content))
+    # 只替换没有 -- 前缀的 setManifestid，subn 一次扫描同时得到替换结果和数量
+    new_content, matches = ACTIVE_MANIFEST_PATTERN.subn(b'--setManifestid', content)
     
     if matches == 0:
-        return (file_path, False, 0)
-    
-    # 执行替换
-    new_content = re.sub(pattern, '--setManifestid', content)
+        return (file_path, False, 0, True)
     
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        return (file_path, True, matches)
+        write_atomic(file_path, new_content)
+        return (file_path, True, matches, True)
     except:
-        return (file_path, False, 0)
+        return (file_path, False, 0, False)
+
+
+def scan_dir(path: str) -> tuple:
+    """扫描单个目录，返回 ([(Lua 文件路径, 大小, mtime_ns)], 子目录列表, 条目数)"""
+    files = []
+    subdirs = []
+    count = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                # 先按文件名判断，只有 .lua 才需要确认是否为文件
+                name = entry.name
+                if name.lower().endswith('.lua') and entry.is_file():
+                    st = entry.stat()
+                    files.append((entry.path, st.st_size, st.st_mtime_ns))
+                elif name not in SKIP_DIRS and entry.is_dir():
+                    subdirs.append(entry.path)
+                count += 1
+    except PermissionError:
+        pass
+    return files, subdirs, count
 
 
-def find_lua_files(directory: str, progress_callback=None) -> list:
-    """快速查找所有 Lua 文件"""
+def find_lua_files(directory: str, progress_callback=None, parallel: bool = False) -> list:
+    """
+    快速查找所有 Lua 文件，返回 [(路径, 大小, mtime_ns)]
+    默认在当前线程顺序遍历；parallel=True 时各目录在线程池中并行扫描
+    (适合网络共享等元数据延迟高的目录)，结果与进度只在当前线程汇总
+    """
     lua_files = []
     count = 0
+    next_report = 1000
+    
+    def collect(files, n):
+        nonlocal count, next_report
+        lua_files.extend(files)
+        count += n
+        if count >= next_report:
+            next_report = (count // 1000 + 1) * 1000
+            if progress_callback:
+                progress_callback(f"已扫描 {count} 个对象...")
     
     try:
-        stack = [directory]
-        while stack:
-            current = stack.pop()
-            try:
-                with os.scandir(current) as it:
-                    for entry in it:
-                        if entry.is_file():
-                            if entry.name.lower().endswith('.lua'):
-                                lua_files.append(entry.path)
-                        elif entry.is_dir():
-                            stack.append(entry.path)
-                        count += 1
-                        if count % 1000 == 0 and progress_callback:
-                            progress_callback(f"已扫描 {count} 个对象...")
-            except PermissionError:
-                continue
+        if not parallel:
+            stack = [directory]
+            while stack:
+                files, subdirs, n = scan_dir(stack.pop())
+                stack.extend(subdirs)
+                collect(files, n)
+        else:
+            with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+                pending = {executor.submit(scan_dir, directory)}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        files, subdirs, n = future.result()
+                        pending.update(executor.submit(scan_dir, d) for d in subdirs)
+                        collect(files, n)
     except Exception as e:
         if progress_callback:
             progress_callback(f"扫描出错: {e}")
@@ -79,13 +209,14 @@ def find_lua_files(directory: str, progress_callback=None) -> list:
     return lua_files
 
 
-def run_replace(target_dir: str, progress_callback=None) -> dict:
+def run_replace(target_dir: str, progress_callback=None, parallel_scan: bool = False) -> dict:
     """
     运行替换并返回结果
     
     Args:
         target_dir: 目标目录
         progress_callback: 进度回调函数 callback(message)
+        parallel_scan: 是否并行遍历目录 (网络共享等高延迟目录)
         
     Returns:
         {
@@ -95,47 +226,91 @@ def run_replace(target_dir: str, progress_callback=None) -> dict:
             "message": str
         }
     """
-    def log(msg):
+    # 标准输出按缓冲写入，只在各阶段开始和结束时刷新
+    def log(msg, flush=False):
         if progress_callback:
             progress_callback(msg)
-        print(msg, flush=True)
+        print(msg, flush=flush)
+    
+    def flush_stdout():
+        # 打包后的窗口程序没有标准输出
+        if sys.stdout is not None:
+            sys.stdout.flush()
     
     if not os.path.exists(target_dir):
         return {"success": False, "total": 0, "modified": 0, "message": f"目录不存在: {target_dir}"}
     
-    log(f"开始扫描目录: {target_dir}")
+    log(f"开始扫描目录: {target_dir}", flush=True)
     
     # 查找所有 Lua 文件
     if os.path.isfile(target_dir):
-        lua_files = [target_dir]
+        st = os.stat(target_dir)
+        lua_files = [(target_dir, st.st_size, st.st_mtime_ns)]
     else:
-        lua_files = find_lua_files(target_dir, log)
+        lua_files = find_lua_files(target_dir, log, parallel=parallel_scan)
     
     if not lua_files:
+        flush_stdout()
         return {"success": True, "total": 0, "modified": 0, "message": "未找到任何 Lua 文件"}
     
-    log(f"找到 {len(lua_files)} 个 Lua 文件，开始处理...")
+    log(f"找到 {len(lua_files)} 个 Lua 文件，开始处理...", flush=True)
     
-    # 逐个处理文件
+    # 跳过上次已确认无需处理且 mtime / 大小都未变化的文件
+    cache = load_replace_cache()
+    stats = {}
+    to_check = []
+    for file_path, size, mtime_ns in lua_files:
+        key = os.path.abspath(file_path)
+        stats[file_path] = (key, size, mtime_ns)
+        if cache.get(key) != [mtime_ns, size]:
+            to_check.append((file_path, size))
+    
+    if len(to_check) < len(lua_files):
+        log(f"跳过 {len(lua_files) - len(to_check)} 个未变化的文件")
+    
+    # 线程池并发读写 (I/O 密集)，进度只在当前线程汇报
     modified_count = 0
     modified_files = []
+    max_workers = min(32, (os.cpu_count() or 4) * 4)
+    ticks_left = PROGRESS_EVERY
     
-    for i, file_path in enumerate(lua_files):
-        result = replace_in_file(file_path)
-        if result[1]:  # 有修改
-            modified_count += 1
-            modified_files.append((result[0], result[2]))
-        
-        if (i + 1) % 500 == 0:
-            log(f"已处理 {i + 1}/{len(lua_files)} 个文件...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(replace_in_file, [p for p, _ in to_check], [n for _, n in to_check])
+        for i, result in enumerate(results):
+            key, size, mtime_ns = stats[result[0]]
+            if result[1]:  # 有修改
+                modified_count += 1
+                # 只保留用于显示的前几个，其余只计数
+                if len(modified_files) < SHOW_MODIFIED_LIMIT:
+                    modified_files.append((result[0], result[2]))
+                # 修改后已没有未注释的 setManifestid，按写入后的状态记录
+                try:
+                    st = os.stat(result[0])
+                    cache[key] = [st.st_mtime_ns, st.st_size]
+                except OSError:
+                    cache.pop(key, None)
+            elif result[3]:
+                cache[key] = [mtime_ns, size]
+            else:
+                cache.pop(key, None)
+            
+            ticks_left -= 1
+            if not ticks_left:
+                ticks_left = PROGRESS_EVERY
+                log(f"已处理 {i + 1}/{len(to_check)} 个文件...")
+    
+    if not os.path.isfile(target_dir):
+        prune_replace_cache(cache, target_dir, {key for key, _, _ in stats.values()})
+    save_replace_cache(cache)
     
     # 生成结果
     if modified_count > 0:
         log(f"已禁用 {modified_count} 个文件的固定清单:")
-        for fp, count in modified_files[:10]:
+        for fp, count in modified_files:
             log(f"  {os.path.basename(fp)} ({count} 处)")
-        if len(modified_files) > 10:
-            log(f"  ... 还有 {len(modified_files) - 10} 个")
+        if modified_count > len(modified_files):
+            log(f"  ... 还有 {modified_count - len(modified_files)} 个")
+    flush_stdout()
     
     return {"success": True, "total": len(lua_files), "modified": modified_count, 
             "message": f"处理完成，{modified_count}/{len(lua_files)} 个文件被修改"}
@@ -143,13 +318,16 @@ def run_replace(target_dir: str, progress_callback=None) -> dict:
 
 def main():
     """命令行入口"""
-    if len(sys.argv) > 1:
-        search_dir = ' '.join(sys.argv[1:]).strip('"').strip("'")
+    parallel_scan = "--parallel-scan" in sys.argv
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    
+    if args:
+        search_dir = ' '.join(args).strip('"').strip("'")
     else:
         search_dir = os.getcwd()
     
     search_dir = os.path.abspath(search_dir)
-    result = run_replace(search_dir)
+    result = run_replace(search_dir, parallel_scan=parallel_scan)
     print(result["message"])
 
 